@@ -0,0 +1,121 @@
+import hashlib
+from typing import Dict, List, Set, Tuple
+
+from cache import content_hash
+from fingerprint import fingerprint, ngram_hashes, stable_hash
+from jaccard import build_ngrams
+from utils import normalize_code, tokenize_code
+
+
+class BaseCode:
+    """
+    Starter code shipped with an assignment, removed from every submission
+    before scoring.
+
+    Base files are preprocessed once into exclusion sets:
+      - hashed token k-grams, used to cut the base tokens out of token streams (LCS)
+      - normalized n-grams, subtracted from Jaccard n-gram sets
+      - winnowed fingerprints, subtracted from Corpus fingerprint sets, which
+        must therefore use the same k and window
+    The raw files are kept as well, so they can be sent to MOSS as base files.
+
+    Example:
+        >>> base = BaseCode()
+        >>> base.add(skeleton_code, "skeleton.cpp")
+        >>> compute_lcs(code_1, code_2, base=base)
+        >>> MossDetector.compute_similarity(code_1, code_2, "cc", base_files=base.files())
+    """
+
+    def __init__(self, k: int = 5, window: int = 4):
+        self.k = k
+        self.window = window
+        self.codes: List[Tuple[str, str]] = []
+        self.token_kgrams: Set[int] = set()
+        self.fingerprints: Set[int] = set()
+        self._normalized: List[List[str]] = []
+        self._ngram_sets: Dict[int, Set[str]] = {}
+        # content hashes rather than a running hashlib object, which cannot
+        # be pickled into a saved Corpus or a worker process
+        self._hashes: List[str] = []
+
+    def __bool__(self) -> bool:
+        return bool(self.codes)
+
+    def add(self, code: str, filename: str | None = None):
+        """
+        Registers a base file and adds it to the exclusion sets.
+        """
+        filename = filename or f"base_{len(self.codes)}"
+        self.codes.append((filename, code))
+        self._hashes.append(content_hash(code))
+
+        tokens = tokenize_code(code)
+        self.token_kgrams.update(ngram_hashes(tokens, self.k))
+        self.fingerprints |= fingerprint(code, self.k, self.window)
+        try:
+            self._normalized.append(normalize_code(code)[0].split())
+        except SyntaxError:
+            # same fallback as Corpus: non-Python code uses raw tokens
+            self._normalized.append(tokens)
+        self._ngram_sets.clear()
+
+    @property
+    def cache_key(self) -> str:
+        """
+        Identity of the registered base files, part of PairCache keys.
+        """
+        digest = hashlib.sha256(" ".join(self._hashes).encode("ascii")).hexdigest()
+        return f"{self.k}:{digest}"
+
+    def files(self) -> Dict[str, str]:
+        """
+        Returns:
+            Dict[str, str]: filename -> code, as expected by MossDetector.
+        """
+        return dict(self.codes)
+
+    def ngram_set(self, n: int) -> Set[str]:
+        """
+        Normalized n-grams of all base files, for Jaccard exclusion.
+        """
+        if n not in self._ngram_sets:
+            result: Set[str] = set()
+            for tokens in self._normalized:
+                result.update(build_ngrams(tokens, n))
+            self._ngram_sets[n] = result
+        return self._ngram_sets[n]
+
+    def strip_tokens(self, tokens: List[str]) -> List[str]:
+        """
+        Removes every token covered by a k-gram that also occurs in a base file.
+        """
+        if not self.token_kgrams or len(tokens) < self.k:
+            return tokens
+        covered = [False] * len(tokens)
+        for i in range(len(tokens) - self.k + 1):
+            if stable_hash(" ".join(tokens[i : i + self.k])) in self.token_kgrams:
+                for j in range(i, i + self.k):
+                    covered[j] = True
+        return [tok for tok, cov in zip(tokens, covered) if not cov]
+
+    def strip_ngrams(self, ngrams: Set[str], n: int) -> Set[str]:
+        return ngrams - self.ngram_set(n) if self.codes else ngrams
+
+    def check_fingerprint_params(self, k: int, window: int):
+        """
+        Raises:
+            ValueError: if fingerprints built with (k, window) cannot be
+                compared with the base fingerprints.
+        """
+        if (k, window) != (self.k, self.window):
+            raise ValueError(
+                f"base code fingerprints use k={self.k}, window={self.window}, "
+                f"got k={k}, window={window}"
+            )
+
+    def strip_fingerprints(self, fingerprints: Set[int], k: int, window: int) -> Set[int]:
+        """
+        Removes the base fingerprints from fingerprints built with (k, window).
+        """
+        self.check_fingerprint_params(k, window)
+        return fingerprints - self.fingerprints
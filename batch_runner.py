@@ -0,0 +1,277 @@
+"""Command-line batch runner comparing every pair of submissions.
+
+Usage:
+    python -m batch_runner submissions/ --metric lcs --metric jaccard \\
+        --threshold lcs=0.6 --threshold jaccard=0.4 --jobs 8 --format csv --output results.csv
+
+The source can be a directory, a .zip or a .tar(.gz/.bz2/.xz) archive. Results
+are streamed as soon as worker processes finish them; progress and throughput
+(pairs/s) are reported on stderr.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from typing import Dict, Iterator, List, Tuple
+
+from base import BaseCode
+from metrics import METRICS, get_metric, parse_thresholds, passes_threshold, score_pair
+from pool_worker import imap_bounded, init_worker, state
+from profiling import PROFILER, count
+
+DEFAULT_EXTENSIONS = (".py", ".c", ".cc", ".cpp", ".h", ".hpp", ".java", ".js", ".cs")
+
+
+def load_submissions(source: str, extensions=DEFAULT_EXTENSIONS) -> Dict[str, str]:
+    """
+    Reads submissions from a directory or an archive.
+
+    Args:
+        source (str): directory, .zip or .tar archive
+        extensions: only files ending with one of these are loaded
+
+    Returns:
+        Dict[str, str]: relative path -> code, sorted by path
+    """
+    codes: Dict[str, str] = {}
+
+    def wanted(name: str) -> bool:
+        return name.lower().endswith(tuple(extensions))
+
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for filename in files:
+                path = os.path.join(root, filename)
+                if wanted(filename):
+                    with open(path, encoding="utf-8", errors="ignore") as f:
+                        codes[os.path.relpath(path, source)] = f.read()
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and wanted(info.filename):
+                    codes[info.filename] = archive.read(info).decode("utf-8", "ignore")
+    elif tarfile.is_tarfile(source):
+        with tarfile.open(source) as archive:
+            for member in archive.getmembers():
+                if member.isfile() and wanted(member.name):
+                    data = archive.extractfile(member).read()
+                    codes[member.name] = data.decode("utf-8", "ignore")
+    else:
+        raise ValueError(f"{source} is neither a directory nor a zip/tar archive")
+    count("files", len(codes))
+    return dict(sorted(codes.items()))
+
+
+def _worker_state(codes: Dict[str, str], metrics: List[Tuple[str, dict]]) -> dict:
+    return {
+        "codes": codes,
+        "metrics": [(name, get_metric(name)[0], params) for name, params in metrics],
+    }
+
+
+def _score_pairs(pairs: List[Tuple[str, str]]) -> List[dict]:
+    codes = state["codes"]
+    rows = []
+    for file_1, file_2 in pairs:
+        row = {"file_1": file_1, "file_2": file_2}
+        row.update(score_pair(codes[file_1], codes[file_2], state["metrics"]))
+        rows.append(row)
+    return rows
+
+
+class ResultWriter:
+    """
+    Streams result rows as CSV or JSON lines, flushing after every row.
+    """
+
+    def __init__(self, stream, fmt: str, metrics: List[str]):
+        self.stream = stream
+        self.fmt = fmt
+        if fmt == "csv":
+            self.csv = csv.DictWriter(
+                stream, fieldnames=["file_1", "file_2", *metrics, "error"], restval=""
+            )
+            self.csv.writeheader()
+
+    def write(self, row: dict):
+        if self.fmt == "csv":
+            self.csv.writerow(row)
+        else:
+            self.stream.write(json.dumps(row) + "\n")
+        self.stream.flush()
+
+
+class Progress:
+    """
+    Prints processed pairs and throughput to stderr, at most once per interval.
+    """
+
+    def __init__(self, total: int, interval: float = 1.0, stream=sys.stderr):
+        self.total = total
+        self.interval = interval
+        self.stream = stream
+        self.done = 0
+        self.start = time.perf_counter()
+        self.last = self.start
+
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.start
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def update(self, n: int = 1):
+        self.done += n
+        now = time.perf_counter()
+        if now - self.last >= self.interval or self.done == self.total:
+            self.last = now
+            self.stream.write(f"\r{self.done}/{self.total} pairs, {self.rate():.1f} pairs/s")
+            self.stream.flush()
+
+    def finish(self):
+        elapsed = time.perf_counter() - self.start
+        self.stream.write(
+            f"\n{self.done} pairs in {elapsed:.2f}s ({self.rate():.1f} pairs/s)\n"
+        )
+
+
+def run(
+    codes: Dict[str, str],
+    metrics: List[Tuple[str, dict]],
+    jobs: int = 1,
+    chunksize: int = 16,
+) -> Iterator[dict]:
+    """
+    Scores every pair of submissions, yielding rows in completion order.
+
+    Args:
+        codes (Dict[str, str]): filename -> code
+        metrics: (metric name, parameters) pairs, names from metrics.METRICS
+        jobs (int): number of worker processes
+        chunksize (int): pairs handed to a worker at once; at most 4 * jobs
+            chunks are queued, so memory does not grow with the number of pairs
+
+    Yields:
+        dict: {"file_1", "file_2", <metric>: score, ...}
+    """
+    pairs = combinations(list(codes), 2)
+    if jobs <= 1:
+        init_worker(_worker_state(codes, metrics))
+        for pair in pairs:
+            yield from _score_pairs([pair])
+        return
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=init_worker,
+        initargs=(_worker_state(codes, metrics), PROFILER.settings()),
+    ) as pool:
+        yield from imap_bounded(pool, _score_pairs, pairs, chunksize, 4 * jobs)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m batch_runner",
+        description="Compare every pair of submissions in a directory or archive.",
+    )
+    parser.add_argument("source", help="directory, .zip or .tar archive with submissions")
+    parser.add_argument(
+        "-m", "--metric", action="append", choices=sorted(METRICS),
+        help="metric to compute, can be repeated (default: lcs)",
+    )
+    parser.add_argument(
+        "-t", "--threshold", action="append", metavar="[METRIC=]SCORE",
+        help="only output pairs where at least one metric reaches its threshold; "
+        "can be repeated, a bare SCORE applies to every metric (default: 0)",
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("-f", "--format", choices=("csv", "jsonl"), default="csv")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument("-n", type=int, default=3, help="n-gram size for Jaccard")
+    parser.add_argument("--approximate", action="store_true", help="use approximate LCS")
+    parser.add_argument("--base", action="append", default=[], help="starter code file, can be repeated")
+    parser.add_argument(
+        "--extensions", default=",".join(DEFAULT_EXTENSIONS),
+        help="comma separated file extensions to load",
+    )
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not report progress")
+    parser.add_argument(
+        "--profile", metavar="FILE",
+        help="write stage timings and counters to FILE (JSON, Prometheus text if it ends with .prom)",
+    )
+    parser.add_argument(
+        "--profile-memory", action="store_true", help="with --profile, also trace peak memory per stage"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.profile:
+        PROFILER.enable(trace_memory=args.profile_memory)
+    codes = load_submissions(args.source, [e.strip() for e in args.extensions.split(",")])
+    if len(codes) < 2:
+        print(f"found {len(codes)} submissions, nothing to compare", file=sys.stderr)
+        return 1
+
+    base = None
+    if args.base:
+        base = BaseCode()
+        for path in args.base:
+            with open(path, encoding="utf-8", errors="ignore") as f:
+                base.add(f.read(), os.path.basename(path))
+
+    metric_names = args.metric or ["lcs"]
+    try:
+        thresholds = parse_thresholds(metric_names, args.threshold)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    metrics = []
+    for name in metric_names:
+        params = dict(get_metric(name)[1])
+        if name == "jaccard":
+            params["n"] = args.n
+        if name == "lcs" and args.approximate:
+            params["approximate"] = True
+        if base:
+            params["base"] = base
+        metrics.append((name, params))
+
+    total = len(codes) * (len(codes) - 1) // 2
+    progress = None if args.quiet else Progress(total)
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    failed = 0
+    try:
+        writer = ResultWriter(out, args.format, metric_names)
+        for row in run(codes, metrics, args.jobs):
+            if "error" in row:
+                failed += 1
+            if passes_threshold(row, thresholds):
+                writer.write(row)
+            if progress:
+                progress.update()
+    except BrokenPipeError:
+        # output piped into e.g. head, which exited early
+        return 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if progress:
+        progress.finish()
+    if args.profile:
+        if args.profile.endswith(".prom"):
+            with open(args.profile, "w", encoding="utf-8") as f:
+                f.write(PROFILER.to_prometheus())
+        else:
+            PROFILER.to_json(args.profile)
+    if failed:
+        print(f"{failed} pairs had errors, see the error column", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import sqlite3
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from profiling import count
+
+# pairs per SELECT, keeps the number of bound variables under SQLite's limit
+LOOKUP_CHUNK = 400
+
+
+def content_hash(code: str) -> str:
+    """
+    Returns the SHA-256 hex digest of a code snippet, used as its cache identity.
+    """
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def canonical_pair(hash_1: str, hash_2: str) -> Tuple[str, str]:
+    """
+    All cached metrics are symmetric, so (a, b) and (b, a) share one entry.
+    """
+    return (hash_1, hash_2) if hash_1 <= hash_2 else (hash_2, hash_1)
+
+
+class PairCache:
+    """
+    Persistent cache of pairwise similarity scores stored in SQLite.
+
+    Entries are keyed by (metric, params, hash(code_1), hash(code_2)) with the
+    two hashes in canonical order, so rerunning a comparison after adding a few
+    late submissions only computes pairs that involve new or changed files.
+
+    The connection may be used from another thread than the one that opened
+    it (the service does its cache calls in a dedicated thread), but calls
+    must not run concurrently.
+
+    Example:
+        >>> cache = PairCache("scores.sqlite")
+        >>> compute_lcs(code_1, code_2, cache=cache)  # computed and stored
+        >>> compute_lcs(code_1, code_2, cache=cache)  # read from the cache
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pair_scores (
+                metric TEXT NOT NULL,
+                params TEXT NOT NULL,
+                hash_1 TEXT NOT NULL,
+                hash_2 TEXT NOT NULL,
+                score REAL NOT NULL,
+                PRIMARY KEY (metric, params, hash_1, hash_2)
+            ) WITHOUT ROWID
+            """
+        )
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _params_key(params: dict | None) -> str:
+        # objects such as BaseCode are represented by their cache_key
+        return json.dumps(
+            params or {}, sort_keys=True, default=lambda value: value.cache_key
+        )
+
+    def get_many(
+        self, metric: str, params: dict | None, pairs: Iterable[Tuple[str, str]]
+    ) -> Dict[Tuple[str, str], float]:
+        """
+        Bulk lookup of hash pairs.
+
+        Args:
+            metric (str): metric name, e.g. "lcs"
+            params (dict | None): parameters the metric was called with
+            pairs: hash pairs in any order
+
+        Returns:
+            Dict[Tuple[str, str], float]: scores of the pairs that were found,
+            keyed by canonical hash pair.
+        """
+        params_key = self._params_key(params)
+        wanted = list({canonical_pair(a, b) for a, b in pairs})
+        found: Dict[Tuple[str, str], float] = {}
+        for start in range(0, len(wanted), LOOKUP_CHUNK):
+            chunk = wanted[start : start + LOOKUP_CHUNK]
+            placeholders = ",".join("(?, ?)" for _ in chunk)
+            args: List[str] = [metric, params_key]
+            for a, b in chunk:
+                args.extend((a, b))
+            rows = self.conn.execute(
+                "SELECT hash_1, hash_2, score FROM pair_scores "
+                "WHERE metric = ? AND params = ? "
+                f"AND (hash_1, hash_2) IN (VALUES {placeholders})",
+                args,
+            )
+            for a, b, score in rows:
+                found[(a, b)] = score
+        self.hits += len(found)
+        self.misses += len(wanted) - len(found)
+        count("cache_hits", len(found))
+        count("cache_misses", len(wanted) - len(found))
+        return found
+
+    def put_many(
+        self, metric: str, params: dict | None, items: Iterable[Tuple[str, str, float]]
+    ):
+        """
+        Bulk insert of (hash_1, hash_2, score) triples in a single transaction.
+        """
+        params_key = self._params_key(params)
+        rows = [(metric, params_key, *canonical_pair(a, b), score) for a, b, score in items]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO pair_scores VALUES (?, ?, ?, ?, ?)", rows
+            )
+
+    def get_or_compute(
+        self,
+        metric: str,
+        params: dict | None,
+        code_1: str,
+        code_2: str,
+        compute: Callable[[], float],
+    ) -> float:
+        """
+        Returns the cached score for a single pair, computing and storing it on a miss.
+        """
+        key = canonical_pair(content_hash(code_1), content_hash(code_2))
+        found = self.get_many(metric, params, [key])
+        if key in found:
+            return found[key]
+        score = compute()
+        self.put_many(metric, params, [(*key, score)])
+        return score
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,206 @@
+import pickle
+from typing import Dict, List, Set
+
+import numpy as np
+
+from fingerprint import fingerprint, stable_hash
+from jaccard import build_ngrams
+from lcs import normalized_lcs
+from profiling import count
+from utils import normalize_code, tokenize_code
+
+
+# DP budget of the approximate LCS computed for the top query candidates; an
+# exact 500 x 500 token DP costs ~50 ms in pure Python, ten of them would use
+# up the whole latency budget of a query
+LCS_MAX_CELLS = 20_000
+
+
+class Document:
+    """
+    Preprocessed form of one submission, computed once when it enters the corpus.
+
+    Attributes:
+        name: display name / filename
+        tokens: tokenize_code output, used for LCS
+        ngrams: hashed n-grams of the normalized code, used for Jaccard
+        fingerprints: winnowed fingerprints of the raw tokens
+    Everything shared with the base (starter) code, if any, is already removed.
+    """
+
+    def __init__(
+        self, name: str, code: str, n: int = 3, k: int = 5, window: int = 4, base=None
+    ):
+        self.name = name
+        tokens = tokenize_code(code)
+        count("files")
+        count("tokens", len(tokens))
+        try:
+            normalized = normalize_code(code)[0].split()
+        except SyntaxError:
+            # normalize_code only understands Python; other languages fall
+            # back to the raw token stream
+            normalized = tokens
+        ngrams = set(build_ngrams(normalized, n))
+        fingerprints = fingerprint(code, k, window)
+        if base:
+            tokens = base.strip_tokens(tokens)
+            ngrams = base.strip_ngrams(ngrams, n)
+            fingerprints = base.strip_fingerprints(fingerprints, k, window)
+        self.tokens: List[str] = tokens
+        self.ngrams: Set[int] = {stable_hash(ngram) for ngram in ngrams}
+        self.fingerprints: Set[int] = fingerprints
+
+
+class Corpus:
+    """
+    Incrementally growing collection of preprocessed submissions.
+
+    New submissions are scored against every stored document in one pass:
+    instead of comparing pair by pair, the corpus keeps inverted indexes
+    (n-gram -> documents, fingerprint -> documents), so the intersection sizes
+    with all stored documents come out of a single numpy bincount. Exact LCS is
+    only computed for the `lcs_top` best candidates. With a BaseCode, starter
+    code is stripped from every document before it is indexed or queried.
+
+    Example:
+        >>> corpus = Corpus()
+        >>> for name, code in submissions.items():
+        ...     corpus.add(name, code)
+        >>> corpus.check("late.py", late_code)
+        [{'name': 'a.py', 'jaccard': 0.82, 'fingerprint': 0.9, 'lcs': 0.88}, ...]
+        >>> corpus.save("corpus.pkl")
+    """
+
+    def __init__(self, n: int = 3, k: int = 5, window: int = 4, base=None):
+        if base is not None:
+            base.check_fingerprint_params(k, window)
+        self.n = n
+        self.k = k
+        self.window = window
+        self.base = base
+        self.docs: List[Document] = []
+        self.index: Dict[str, int] = {}
+        self.ngram_postings: Dict[int, List[int]] = {}
+        self.fp_postings: Dict[int, List[int]] = {}
+        self.ngram_sizes: List[int] = []
+        self.fp_sizes: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def preprocess(self, name: str, code: str) -> Document:
+        return Document(name, code, self.n, self.k, self.window, self.base)
+
+    def add(self, name: str, code: str) -> Document:
+        """
+        Preprocess a submission and add it to the corpus.
+        """
+        if name in self.index:
+            raise ValueError(f"{name!r} is already in the corpus")
+        return self.add_document(self.preprocess(name, code))
+
+    def add_document(self, doc: Document) -> Document:
+        doc_id = len(self.docs)
+        self.docs.append(doc)
+        self.index[doc.name] = doc_id
+        for h in doc.ngrams:
+            self.ngram_postings.setdefault(h, []).append(doc_id)
+        for h in doc.fingerprints:
+            self.fp_postings.setdefault(h, []).append(doc_id)
+        self.ngram_sizes.append(len(doc.ngrams))
+        self.fp_sizes.append(len(doc.fingerprints))
+        return doc
+
+    def _overlap(self, keys: Set[int], postings: Dict[int, List[int]]) -> np.ndarray:
+        hits = [postings[h] for h in keys if h in postings]
+        if not hits:
+            return np.zeros(len(self.docs), dtype=np.int64)
+        flat = np.fromiter(
+            (doc_id for ids in hits for doc_id in ids), dtype=np.int64
+        )
+        return np.bincount(flat, minlength=len(self.docs))
+
+    @staticmethod
+    def _jaccard(inter: np.ndarray, size: int, sizes: List[int]) -> np.ndarray:
+        union = size + np.asarray(sizes, dtype=np.int64) - inter
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(union > 0, inter / union, 0.0)
+
+    def query(
+        self, doc: Document, lcs_top: int = 10, threshold: float = 0.0, exact_lcs: bool = False
+    ) -> List[dict]:
+        """
+        Score a preprocessed document against the whole corpus.
+
+        Args:
+            doc: Document - the new submission
+            lcs_top: int - compute LCS for this many best Jaccard candidates
+            threshold: float - only report documents whose Jaccard or
+                fingerprint similarity reaches this value
+            exact_lcs: bool - use the exact LCS DP instead of approximate_lcs,
+                which is a lower bound and much faster on long files
+
+        Returns:
+            List[dict]: one entry per stored document, best Jaccard first, with
+            keys "name", "jaccard", "fingerprint" and, for the top candidates, "lcs".
+        """
+        if not self.docs:
+            return []
+        jaccard = self._jaccard(
+            self._overlap(doc.ngrams, self.ngram_postings), len(doc.ngrams), self.ngram_sizes
+        )
+        fp = self._jaccard(
+            self._overlap(doc.fingerprints, self.fp_postings), len(doc.fingerprints), self.fp_sizes
+        )
+        order = np.argsort(-jaccard, kind="stable")
+
+        results = []
+        for rank, doc_id in enumerate(order):
+            if jaccard[doc_id] < threshold and fp[doc_id] < threshold:
+                continue
+            other = self.docs[doc_id]
+            entry = {
+                "name": other.name,
+                "jaccard": float(jaccard[doc_id]),
+                "fingerprint": float(fp[doc_id]),
+            }
+            if rank < lcs_top:
+                entry["lcs"] = normalized_lcs(
+                    doc.tokens, other.tokens, not exact_lcs, LCS_MAX_CELLS
+                )
+            results.append(entry)
+        return results
+
+    def check(
+        self,
+        name: str,
+        code: str,
+        lcs_top: int = 10,
+        threshold: float = 0.0,
+        add: bool = True,
+        exact_lcs: bool = False,
+    ) -> List[dict]:
+        """
+        Compare a new submission with everything stored so far, then (by default)
+        add it to the corpus so later submissions are checked against it too.
+
+        Raises:
+            ValueError: if add is set and `name` is already in the corpus.
+        """
+        if add and name in self.index:
+            raise ValueError(f"{name!r} is already in the corpus")
+        doc = self.preprocess(name, code)
+        results = self.query(doc, lcs_top, threshold, exact_lcs)
+        if add:
+            self.add_document(doc)
+        return results
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path: str) -> "Corpus":
+        with open(path, "rb") as f:
+            return pickle.load(f)
@@ -0,0 +1,437 @@
+"""Sharded all-pairs execution through a file-based work queue.
+
+Any number of worker processes, on one machine or on several nodes that share
+a filesystem, cooperate through a work directory:
+
+    <workdir>/manifest.json        metrics, block size, lease time, digest
+    <workdir>/documents.json       [[name, code], ...]
+    <workdir>/blocks/<id>.json     row and column ranges of a block of pairs
+    <workdir>/claims/<id>.lock     held by the worker computing the block
+    <workdir>/results/<id>.jsonl   finished block, one scored pair per line
+
+Usage:
+    python -m distributed init submissions/ work/ -m lcs -m jaccard --block-size 64
+    python -m distributed work work/          # start as many as you like
+    python -m distributed status work/
+    python -m distributed reduce work/ -o results.jsonl --threshold lcs=0.5
+
+A block is claimed by creating its lock file with O_EXCL and writing the
+worker id into it. The worker touches the lock while it computes; a lock that
+was not touched for lease_seconds is considered abandoned (worker died) and
+can be stolen by renaming it away. The thief then checks that what it renamed
+is the stale lock it inspected, not a fresh claim another worker made in the
+meantime, and puts a fresh claim back if it is not. Workers only ever remove
+their own locks. Results are written to a temporary file and renamed into place, so a block's
+result file is either complete or absent.
+
+The manifest records a digest of the documents and metrics. Workers and the
+reducer check it, and init refuses to reuse a work directory unless forced,
+so results of an earlier run are never mixed into a new one.
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import sys
+import time
+import uuid
+from typing import Dict, Iterator, List, Tuple
+
+from cache import content_hash
+from metrics import get_metric, parse_thresholds, passes_threshold, score_pair
+
+
+def _write_json(path: str, data):
+    tmp = f"{path}.tmp.{uuid.uuid4().hex}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def run_digest(documents: List[Tuple[str, str]], metrics: List[Tuple[str, dict]]) -> str:
+    """
+    Returns:
+        str: digest identifying a run by its documents and metrics.
+    """
+    return content_hash(json.dumps([list(map(list, documents)), metrics], sort_keys=True))
+
+
+def _read_manifest(workdir: str) -> dict:
+    """
+    Reads the manifest and checks that documents.json still belongs to it.
+
+    Raises:
+        ValueError: if the documents or metrics differ from the ones the
+            work directory was initialized with.
+    """
+    with open(os.path.join(workdir, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    with open(os.path.join(workdir, "documents.json"), encoding="utf-8") as f:
+        documents = json.load(f)
+    if run_digest(documents, manifest["metrics"]) != manifest.get("digest"):
+        raise ValueError(
+            f"{workdir} does not match its manifest: documents or metrics changed since init"
+        )
+    return manifest
+
+
+def init_workdir(
+    workdir: str,
+    codes: Dict[str, str],
+    metrics: List[Tuple[str, dict]],
+    block_size: int = 64,
+    lease_seconds: float = 300.0,
+    force: bool = False,
+) -> int:
+    """
+    Describes an all-pairs run in a work directory.
+
+    Args:
+        workdir (str): shared directory, created if missing
+        codes (Dict[str, str]): filename -> code
+        metrics: (metric name, parameters) pairs, names from metrics.METRICS
+        block_size (int): documents per block side, a block has up to
+            block_size ** 2 pairs
+        lease_seconds (float): how long a claim may go untouched before
+            other workers treat its owner as dead
+        force (bool): reuse a work directory that was already initialized,
+            deleting its blocks, claims and results
+
+    Returns:
+        int: number of blocks.
+
+    Raises:
+        FileExistsError: if workdir was already initialized and force is False.
+    """
+    for name, _ in metrics:
+        get_metric(name)
+    manifest_path = os.path.join(workdir, "manifest.json")
+    leftovers = [
+        sub for sub in ("claims", "results")
+        if os.path.isdir(os.path.join(workdir, sub)) and os.listdir(os.path.join(workdir, sub))
+    ]
+    if os.path.exists(manifest_path) or leftovers:
+        if not force:
+            raise FileExistsError(f"{workdir} is already initialized, pass force=True (--force) to start over")
+        # no worker may pick up the old run while it is being replaced
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        for sub in ("blocks", "claims", "results"):
+            shutil.rmtree(os.path.join(workdir, sub), ignore_errors=True)
+    for sub in ("blocks", "claims", "results"):
+        os.makedirs(os.path.join(workdir, sub), exist_ok=True)
+
+    documents = list(codes.items())
+    _write_json(os.path.join(workdir, "documents.json"), documents)
+    num_docs = len(codes)
+    starts = list(range(0, num_docs, block_size))
+    block_id = 0
+    for bi, row_start in enumerate(starts):
+        for col_start in starts[bi:]:
+            _write_json(
+                os.path.join(workdir, "blocks", f"{block_id}.json"),
+                {
+                    "rows": [row_start, min(row_start + block_size, num_docs)],
+                    "cols": [col_start, min(col_start + block_size, num_docs)],
+                },
+            )
+            block_id += 1
+    _write_json(
+        manifest_path,
+        {
+            "digest": run_digest(documents, metrics),
+            "metrics": metrics,
+            "num_docs": num_docs,
+            "block_size": block_size,
+            "num_blocks": block_id,
+            "lease_seconds": lease_seconds,
+        },
+    )
+    return block_id
+
+
+class Worker:
+    """
+    Claims and computes blocks until none are left.
+
+    Example:
+        >>> Worker("work/").run()
+        12
+    """
+
+    def __init__(self, workdir: str, worker_id: str | None = None, heartbeat: float | None = None):
+        self.workdir = workdir
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.manifest = _read_manifest(workdir)
+        self.lease = self.manifest["lease_seconds"]
+        self.heartbeat = heartbeat if heartbeat is not None else self.lease / 4
+        self.metrics = [
+            (name, get_metric(name)[0], params) for name, params in self.manifest["metrics"]
+        ]
+        self._docs = None
+
+    @property
+    def docs(self) -> List[Tuple[str, str]]:
+        if self._docs is None:
+            with open(os.path.join(self.workdir, "documents.json"), encoding="utf-8") as f:
+                self._docs = json.load(f)
+        return self._docs
+
+    def _path(self, sub: str, block_id: int, ext: str) -> str:
+        return os.path.join(self.workdir, sub, f"{block_id}{ext}")
+
+    def is_done(self, block_id: int) -> bool:
+        return os.path.exists(self._path("results", block_id, ".jsonl"))
+
+    @staticmethod
+    def _read_lock(path: str) -> Tuple[str | None, float]:
+        """
+        Returns:
+            (owner worker id, mtime) of a lock file; the owner is None while
+            the file is still being written.
+        """
+        mtime = os.stat(path).st_mtime
+        try:
+            with open(path, encoding="utf-8") as f:
+                owner = json.load(f).get("worker")
+        except ValueError:
+            owner = None
+        return owner, mtime
+
+    def _steal(self, lock: str, owner: str | None, mtime: float) -> bool:
+        """
+        Renames away a lock that was seen stale with the given owner and mtime.
+
+        Returns:
+            bool: True if the stale lock is gone, False if the rename took a
+            different (live) lock, which is then put back.
+        """
+        stolen = f"{lock}.stale.{self.worker_id}.{time.time_ns()}"
+        try:
+            os.rename(lock, stolen)
+        except FileNotFoundError:
+            return False
+        try:
+            taken = self._read_lock(stolen)
+        except FileNotFoundError:
+            return False
+        if taken == (owner, mtime):
+            os.remove(stolen)
+            return True
+        # another worker replaced the stale lock first: restore its claim,
+        # unless yet another claim has been created in the meantime
+        try:
+            os.link(stolen, lock)
+        except FileExistsError:
+            pass
+        os.remove(stolen)
+        return False
+
+    def claim(self, block_id: int) -> bool:
+        """
+        Atomically claims a block, stealing the claim if its lease expired.
+        """
+        lock = self._path("claims", block_id, ".lock")
+        for _ in range(2):
+            try:
+                fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                try:
+                    owner, mtime = self._read_lock(lock)
+                except FileNotFoundError:
+                    continue
+                if time.time() - mtime < self.lease:
+                    return False
+                # abandoned: only one worker can rename the stale lock away
+                if not self._steal(lock, owner, mtime):
+                    return False
+                continue
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"worker": self.worker_id, "time": time.time()}, f)
+            # the block may have been finished between our check and the claim
+            if self.is_done(block_id):
+                self.release(block_id)
+                return False
+            return True
+        return False
+
+    def owns(self, block_id: int) -> bool:
+        try:
+            return self._read_lock(self._path("claims", block_id, ".lock"))[0] == self.worker_id
+        except FileNotFoundError:
+            return False
+
+    def release(self, block_id: int):
+        """
+        Removes the block's lock if this worker holds it.
+        """
+        if not self.owns(block_id):
+            return
+        try:
+            os.remove(self._path("claims", block_id, ".lock"))
+        except FileNotFoundError:
+            pass
+
+    def _pairs(self, block_id: int) -> Iterator[Tuple[int, int]]:
+        with open(self._path("blocks", block_id, ".json"), encoding="utf-8") as f:
+            block = json.load(f)
+        row_start, row_stop = block["rows"]
+        col_start, col_stop = block["cols"]
+        for i in range(row_start, row_stop):
+            for j in range(max(col_start, i + 1), col_stop):
+                yield i, j
+
+    def compute(self, block_id: int):
+        """
+        Scores every pair of a claimed block and publishes the result file.
+        """
+        lock = self._path("claims", block_id, ".lock")
+        result = self._path("results", block_id, ".jsonl")
+        tmp = f"{result}.tmp.{self.worker_id}"
+        docs = self.docs
+        last_beat = time.time()
+        with open(tmp, "w", encoding="utf-8") as out:
+            for i, j in self._pairs(block_id):
+                (name_1, code_1), (name_2, code_2) = docs[i], docs[j]
+                row = {"file_1": name_1, "file_2": name_2}
+                row.update(score_pair(code_1, code_2, self.metrics))
+                out.write(json.dumps(row) + "\n")
+                if time.time() - last_beat >= self.heartbeat:
+                    last_beat = time.time()
+                    try:
+                        os.utime(lock)
+                    except FileNotFoundError:
+                        pass
+        os.replace(tmp, result)
+
+    def run(self, max_blocks: int | None = None) -> int:
+        """
+        Processes blocks until all are done or claimed by live workers.
+
+        Returns:
+            int: number of blocks computed by this worker.
+        """
+        computed = 0
+        while max_blocks is None or computed < max_blocks:
+            progress = False
+            waiting = False
+            for block_id in range(self.manifest["num_blocks"]):
+                if self.is_done(block_id):
+                    continue
+                if not self.claim(block_id):
+                    waiting = True
+                    continue
+                try:
+                    self.compute(block_id)
+                finally:
+                    self.release(block_id)
+                computed += 1
+                progress = True
+                if max_blocks is not None and computed >= max_blocks:
+                    return computed
+            if not waiting:
+                return computed
+            if not progress:
+                # everything left is claimed: wait for it to finish or expire
+                time.sleep(min(self.heartbeat, 1.0))
+        return computed
+
+
+def status(workdir: str) -> dict:
+    with open(os.path.join(workdir, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    total = manifest["num_blocks"]
+    done = sum(
+        os.path.exists(os.path.join(workdir, "results", f"{b}.jsonl")) for b in range(total)
+    )
+    claimed = sum(
+        os.path.exists(os.path.join(workdir, "claims", f"{b}.lock")) for b in range(total)
+    )
+    return {"blocks": total, "done": done, "claimed": claimed, "pending": total - done}
+
+
+def reduce_results(workdir: str, threshold: float | Dict[str, float] = 0.0) -> Iterator[dict]:
+    """
+    Merges the results of all blocks, keeping pairs where at least one metric
+    reaches its threshold (see metrics.parse_thresholds).
+
+    Raises:
+        RuntimeError: if some blocks are not finished yet.
+        ValueError: if the documents or metrics changed since init.
+    """
+    names = [name for name, _ in _read_manifest(workdir)["metrics"]]
+    thresholds = parse_thresholds(names, threshold)
+    state = status(workdir)
+    if state["pending"]:
+        raise RuntimeError(f"{state['pending']} of {state['blocks']} blocks are not finished")
+    for block_id in range(state["blocks"]):
+        with open(os.path.join(workdir, "results", f"{block_id}.jsonl"), encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                if passes_threshold(row, thresholds):
+                    yield row
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m distributed", description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("init", help="describe a run in a work directory")
+    p.add_argument("source", help="directory, .zip or .tar archive with submissions")
+    p.add_argument("workdir")
+    p.add_argument("-m", "--metric", action="append")
+    p.add_argument("-n", type=int, default=3, help="n-gram size for Jaccard")
+    p.add_argument("--block-size", type=int, default=64)
+    p.add_argument("--lease", type=float, default=300.0, help="seconds before a silent claim expires")
+    p.add_argument(
+        "--force", action="store_true", help="start over in an initialized workdir, deleting its results"
+    )
+
+    p = sub.add_parser("work", help="compute blocks until none are left")
+    p.add_argument("workdir")
+    p.add_argument("--max-blocks", type=int)
+
+    p = sub.add_parser("status", help="show progress")
+    p.add_argument("workdir")
+
+    p = sub.add_parser("reduce", help="merge block results")
+    p.add_argument("workdir")
+    p.add_argument("-o", "--output", help="JSONL output file (default: stdout)")
+    p.add_argument(
+        "-t", "--threshold", action="append", metavar="[METRIC=]SCORE",
+        help="keep pairs where at least one metric reaches its threshold, can be repeated",
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "init":
+        from batch_runner import load_submissions
+
+        metrics = []
+        for name in args.metric or ["lcs"]:
+            params = dict(get_metric(name)[1])
+            if name == "jaccard":
+                params["n"] = args.n
+            metrics.append((name, params))
+        blocks = init_workdir(
+            args.workdir, load_submissions(args.source), metrics, args.block_size, args.lease, args.force
+        )
+        print(f"{blocks} blocks written to {args.workdir}", file=sys.stderr)
+    elif args.command == "work":
+        worker = Worker(args.workdir)
+        print(f"{worker.worker_id}: computed {worker.run(args.max_blocks)} blocks", file=sys.stderr)
+    elif args.command == "status":
+        print(json.dumps(status(args.workdir)))
+    else:
+        out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+        try:
+            for row in reduce_results(args.workdir, args.threshold):
+                out.write(json.dumps(row) + "\n")
+        finally:
+            if out is not sys.stdout:
+                out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
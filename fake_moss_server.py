@@ -0,0 +1,170 @@
+"""Local stand-in for the MOSS server, for testing MossScheduler offline.
+
+It speaks the submission protocol on one port and serves the result pages on
+another. Scores are deterministic: a pair's base score depends only on the two
+filenames, plus a small query-dependent offset, so the same pair reported by
+several queries gets different percentages (which exercises de-duplication).
+
+Usage:
+    >>> with FakeMossServer(drop_queries=1) as server:
+    ...     MossScheduler(codes, user_id="1", server="127.0.0.1", port=server.port).run()
+"""
+import http.server
+import itertools
+import socketserver
+import threading
+import time
+import zlib
+from typing import Dict, List
+
+
+def pair_score(file_1: str, file_2: str) -> int:
+    """
+    Base similarity the fake server reports for a pair, independent of order.
+    """
+    return zlib.crc32("|".join(sorted((file_1, file_2))).encode("utf-8")) % 95
+
+
+def query_offset(files: List[str]) -> int:
+    """
+    Per-query offset (0-4) added to every pair reported by that query.
+    """
+    return zlib.crc32(",".join(files).encode("utf-8")) % 5
+
+
+class FakeMossServer:
+    """
+    Args:
+        threshold (int): pairs scoring below this are not reported
+        drop_queries (int): the first this many queries are answered by
+            closing the connection, like a flaky server
+        delay (float): seconds every query takes, so overlapping queries can
+            be observed
+    Attributes:
+        port: port of the submission protocol
+        queries: filenames of every answered query, in answer order
+        dropped: number of dropped queries
+        max_active: largest number of submissions handled at the same time
+    """
+
+    def __init__(self, threshold: int = 50, drop_queries: int = 0, delay: float = 0.0):
+        self.threshold = threshold
+        self.drop_queries = drop_queries
+        self.delay = delay
+        self.queries: List[List[str]] = []
+        self.dropped = 0
+        self.max_active = 0
+        self._active = 0
+        self._reports: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Submission(socketserver.StreamRequestHandler):
+            def handle(self):
+                server._enter()
+                try:
+                    server._submission(self.rfile, self.wfile)
+                finally:
+                    server._leave()
+
+        class Report(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                try:
+                    body = server._reports[int(self.path.rsplit("/", 1)[1])].encode("utf-8")
+                except (KeyError, ValueError):
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._moss = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Submission)
+        self._http = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Report)
+        self._moss.daemon_threads = self._http.daemon_threads = True
+        self.port = self._moss.server_address[1]
+        self.http_port = self._http.server_address[1]
+
+    def _enter(self):
+        with self._lock:
+            self._active += 1
+            self.max_active = max(self.max_active, self._active)
+
+    def _leave(self):
+        with self._lock:
+            self._active -= 1
+
+    def _submission(self, rfile, wfile):
+        files: List[str] = []
+        while True:
+            line = rfile.readline().decode("utf-8")
+            if not line:
+                return
+            parts = line.split()
+            if not parts:
+                continue
+            if parts[0] == "language":
+                wfile.write(b"yes\n")
+            elif parts[0] == "file":
+                rfile.read(int(parts[3]))
+                # index 0 marks a base file
+                if parts[1] != "0":
+                    files.append(parts[4])
+            elif parts[0] == "query":
+                time.sleep(self.delay)
+                with self._lock:
+                    if self.dropped < self.drop_queries:
+                        self.dropped += 1
+                        return
+                    report_id = len(self.queries)
+                    self.queries.append(files)
+                    self._reports[report_id] = self.report(files, report_id)
+                wfile.write(f"http://127.0.0.1:{self.http_port}/results/{report_id}\n".encode("utf-8"))
+            elif parts[0] == "end":
+                return
+
+    def expected_pairs(self, files: List[str]) -> Dict[tuple, int]:
+        """
+        Returns:
+            Dict[tuple, int]: sorted (file_1, file_2) -> percent_1 of every
+            pair a query with these files reports.
+        """
+        offset = query_offset(files)
+        return {
+            tuple(sorted((a, b))): pair_score(a, b) + offset
+            for a, b in itertools.combinations(files, 2)
+            if pair_score(a, b) >= self.threshold
+        }
+
+    def report(self, files: List[str], report_id: int) -> str:
+        rows = []
+        for (a, b), percent in self.expected_pairs(files).items():
+            url = f"http://127.0.0.1:{self.http_port}/results/{report_id}/match.html"
+            rows.append(
+                f'<TR><TD><A HREF="{url}">{a} ({percent}%)</A>\n'
+                f'    <TD><A HREF="{url}">{b} ({percent - 1}%)</A>\n'
+                f"<TD ALIGN=right>{percent // 3}\n"
+            )
+        return "<HTML><BODY><TABLE>\n" + "".join(rows) + "</TABLE></BODY></HTML>\n"
+
+    def start(self) -> "FakeMossServer":
+        for server in (self._moss, self._http):
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        for server in (self._moss, self._http):
+            server.shutdown()
+            server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,49 @@
+import hashlib
+from typing import List, Set
+
+from jaccard import build_ngrams
+from utils import tokenize_code
+
+
+def stable_hash(text: str) -> int:
+    """
+    64-bit hash of a string that, unlike hash(), is the same in every process,
+    so fingerprints can be stored on disk and shared between workers.
+    """
+    return int.from_bytes(
+        hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big"
+    )
+
+
+def ngram_hashes(tokens: List[str], n: int) -> List[int]:
+    """
+    Hash every token n-gram, keeping their order.
+    """
+    return [stable_hash(ngram) for ngram in build_ngrams(tokens, n)]
+
+
+def winnow(hashes: List[int], window: int) -> Set[int]:
+    """
+    Select fingerprints with the winnowing algorithm used by MOSS.
+
+    From every window of `window` consecutive hashes the minimum is kept, so
+    any match of at least window + n - 1 tokens shares a fingerprint while
+    only a fraction of all hashes is stored.
+
+    Args:
+        hashes (List[int]): n-gram hashes in document order.
+        window (int): winnowing window size.
+
+    Returns:
+        Set[int]: selected fingerprints.
+    """
+    if len(hashes) <= window:
+        return {min(hashes)} if hashes else set()
+    return {min(hashes[i : i + window]) for i in range(len(hashes) - window + 1)}
+
+
+def fingerprint(code: str, n: int = 5, window: int = 4) -> Set[int]:
+    """
+    Language-agnostic fingerprint set of a code snippet, built on tokenize_code.
+    """
+    return winnow(ngram_hashes(tokenize_code(code), n), window)
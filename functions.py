@@ -0,0 +1,221 @@
+import ast
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from fingerprint import ngram_hashes, winnow
+from lcs import normalized_lcs
+from utils import remove_comments_and_docstrings, tokenize_code
+
+# tokens allowed between the closing ")" of a signature and its "{"
+SIGNATURE_SUFFIX = {"const", "override", "final", "noexcept", "volatile", "&", "&&"}
+
+
+class Function:
+    """
+    A single function extracted from a submission.
+
+    Attributes:
+        name: function name (qualified with the class for Python methods)
+        tokens: tokenize_code tokens of the whole function
+        fingerprints: winnowed n-gram hashes of the tokens
+    """
+
+    def __init__(self, name: str, tokens: List[str], k: int = 5, window: int = 4):
+        self.name = name
+        self.tokens = tokens
+        self.fingerprints: Set[int] = winnow(ngram_hashes(tokens, k), window)
+
+    def __repr__(self):
+        return f"Function({self.name!r}, {len(self.tokens)} tokens)"
+
+
+def split_python_functions(code: str) -> List[Tuple[str, str]]:
+    """
+    Splits Python code into (name, source) pairs using the AST.
+    Top-level functions and methods are returned; nested functions stay part
+    of the function that defines them.
+    """
+    code = remove_comments_and_docstrings(code)
+    tree = ast.parse(code)
+    result = []
+
+    def visit(node, prefix):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                result.append((prefix + child.name, ast.get_source_segment(code, child)))
+            elif isinstance(child, ast.ClassDef):
+                visit(child, prefix + child.name + ".")
+
+    visit(tree, "")
+    return result
+
+
+def split_brace_functions(tokens: List[str]) -> List[Tuple[str, List[str]]]:
+    """
+    Splits a C-family token stream (tokenize_code output) into functions by
+    brace matching. A "{" preceded by ")" (optionally followed by qualifiers
+    such as const) opens a function body; other braces outside a function
+    (namespaces, classes, structs) are entered so their methods are found too.
+
+    Returns:
+        List[Tuple[str, List[str]]]: (name, tokens) for every function,
+        the tokens covering the signature and the body.
+    """
+    result = []
+    decl_start = 0
+    i = 0
+    while i < len(tokens):
+        tok = tokens[i]
+        if tok in (";", "}"):
+            decl_start = i + 1
+        elif tok == "{":
+            back = i - 1
+            while back >= decl_start and tokens[back] in SIGNATURE_SUFFIX:
+                back -= 1
+            if back >= decl_start and tokens[back] == ")":
+                # find the "(" of the parameter list and the name in front of it
+                depth = 0
+                while back >= decl_start:
+                    if tokens[back] == ")":
+                        depth += 1
+                    elif tokens[back] == "(":
+                        depth -= 1
+                        if depth == 0:
+                            break
+                    back -= 1
+                name = tokens[back - 1] if back - 1 >= decl_start else "<anonymous>"
+
+                depth = 0
+                end = i
+                while end < len(tokens):
+                    if tokens[end] == "{":
+                        depth += 1
+                    elif tokens[end] == "}":
+                        depth -= 1
+                        if depth == 0:
+                            break
+                    end += 1
+                result.append((name, tokens[decl_start : end + 1]))
+                i = end
+            decl_start = i + 1
+        i += 1
+    return result
+
+
+def split_functions(
+    code: str, language: str | None = None, k: int = 5, window: int = 4, base=None
+) -> List[Function]:
+    """
+    Splits a submission into fingerprinted functions.
+
+    Args:
+        code (str): source code of the whole file
+        language (str | None): "python" uses the AST, anything else brace
+            matching; None tries the Python parser first
+        k, window: fingerprint n-gram size and winnowing window
+        base (BaseCode | None): starter code stripped from every function;
+            functions that are entirely starter code are dropped
+
+    Returns:
+        List[Function]: functions in source order
+    """
+    parts = None
+    if language in (None, "python"):
+        try:
+            parts = [
+                (name, tokenize_code(source))
+                for name, source in split_python_functions(code)
+            ]
+        except SyntaxError:
+            if language == "python":
+                raise
+    if parts is None:
+        parts = split_brace_functions(tokenize_code(code))
+    if base:
+        parts = [(name, base.strip_tokens(tokens)) for name, tokens in parts]
+    return [Function(name, tokens, k, window) for name, tokens in parts if tokens]
+
+
+class FunctionIndex:
+    """
+    Inverted index from fingerprint to the functions containing it, used to
+    find candidate function pairs without comparing all of them.
+    """
+
+    def __init__(self, functions: List[Function]):
+        self.functions = functions
+        self.postings: Dict[int, List[int]] = {}
+        for idx, func in enumerate(functions):
+            for h in func.fingerprints:
+                self.postings.setdefault(h, []).append(idx)
+
+    def candidates(self, func: Function) -> Set[int]:
+        """
+        Returns:
+            Set[int]: indexes of functions sharing at least one fingerprint.
+        """
+        found: Set[int] = set()
+        for h in func.fingerprints:
+            found.update(self.postings.get(h, ()))
+        return found
+
+
+def compute_function_similarity(
+    code_1: str,
+    code_2: str,
+    language: str | None = None,
+    min_score: float = 0.0,
+    base=None,
+) -> dict:
+    """
+    Compares two submissions function by function.
+
+    Steps:
+    1. Split both files into functions and fingerprint each one.
+    2. Use a fingerprint index to find candidate function pairs.
+    3. Score candidates with normalized LCS (small DPs instead of one huge one).
+    4. Solve the best one-to-one assignment between the function sets.
+    5. File score = matched scores weighted by the size of both functions,
+       divided by the total size of all functions.
+
+    Args:
+        code_1, code_2: str - two code snippets
+        language: str | None - see split_functions
+        min_score: float - matches below this score are left out of "matches"
+            but still count towards "score"
+        base: BaseCode | None - starter code removed before comparing
+
+    Return:
+        dict - {"score": float, "matches": [{"function_1", "function_2", "score"}, ...]}
+    """
+    funcs_1 = split_functions(code_1, language, base=base)
+    funcs_2 = split_functions(code_2, language, base=base)
+    total = sum(len(f.tokens) for f in funcs_1) + sum(len(f.tokens) for f in funcs_2)
+    if not funcs_1 or not funcs_2 or total == 0:
+        return {"score": 0.0, "matches": []}
+
+    index = FunctionIndex(funcs_2)
+    scores = np.zeros((len(funcs_1), len(funcs_2)))
+    for i, func in enumerate(funcs_1):
+        for j in index.candidates(func):
+            other = funcs_2[j]
+            scores[i, j] = normalized_lcs(func.tokens, other.tokens)
+
+    rows, cols = linear_sum_assignment(scores, maximize=True)
+    matched = 0.0
+    matches = []
+    for i, j in zip(rows, cols):
+        score = float(scores[i, j])
+        if score <= 0.0:
+            continue
+        matched += score * (len(funcs_1[i].tokens) + len(funcs_2[j].tokens))
+        # weak matches still count towards the file score
+        if score < min_score:
+            continue
+        matches.append(
+            {"function_1": funcs_1[i].name, "function_2": funcs_2[j].name, "score": score}
+        )
+    matches.sort(key=lambda m: m["score"], reverse=True)
+    return {"score": matched / total, "matches": matches}
@@ -1,12 +1,17 @@
-from typing import List
+from typing import List, Set
+from profiling import count, timed
 from utils import normalize_code
 
 
-def compute_jaccard_similarity(code_1: str, code_2: str, n: int) -> float:
+def compute_jaccard_similarity(
+    code_1: str, code_2: str, n: int, cache=None, base=None
+) -> float:
     """
     Args:
         code_1, code_2: str - two code snippets
         n: int - how many tokens are taken into account
+        cache: PairCache | None - optional persistent cache consulted before computing
+        base: BaseCode | None - starter code whose n-grams are ignored
 
     Return:
         float - jaccard similarity between two pieces of code
@@ -14,21 +19,43 @@ def compute_jaccard_similarity(code_1: str, code_2: str, n: int) -> float:
     Steps:
     1. Normalize both code snippets.
     2. Build token n-grams.
-    3. Convert into sets and compute Jaccard similarity.
+    3. Convert into sets and remove n-grams of the base (starter) code.
+    4. Compute Jaccard similarity.
     """
-    norm1 = normalize_code(code_1)[0]
-    norm2 = normalize_code(code_2)[0]
+    if cache is not None:
+        params = {"n": n}
+        if base:
+            params["base"] = base.cache_key
+        return cache.get_or_compute(
+            "jaccard",
+            params,
+            code_1,
+            code_2,
+            lambda: compute_jaccard_similarity(code_1, code_2, n, base=base),
+        )
 
-    tokens1 = norm1.split()
-    tokens2 = norm2.split()
+    count("pairs")
+    set1 = ngram_set(code_1, n)
+    set2 = ngram_set(code_2, n)
+    if base:
+        set1 = base.strip_ngrams(set1, n)
+        set2 = base.strip_ngrams(set2, n)
+    return jaccard_index(set1, set2)
 
+
+def ngram_set(code: str, n: int) -> Set[str]:
+    """
+    Normalizes a code snippet and returns its set of token n-grams.
+    """
+    tokens = normalize_code(code)[0].split()
     # using n-grams to capture local token context
-    ngrams1 = build_ngrams(tokens1, n)
-    ngrams2 = build_ngrams(tokens2, n)
+    return set(build_ngrams(tokens, n))
 
-    set1 = set(ngrams1)
-    set2 = set(ngrams2)
 
+def jaccard_index(set1: Set[str], set2: Set[str]) -> float:
+    """
+    |set1 & set2| / |set1 | set2|, 0.0 if either set is empty.
+    """
     # safeguard against 0/0
     if not set1 and not set2:  # both empty -> dissmiliar
         return 0.0
@@ -42,6 +69,7 @@ def compute_jaccard_similarity(code_1: str, code_2: str, n: int) -> float:
     return intersection / union
 
 
+@timed("build_ngrams")
 def build_ngrams(tokens: List[str], n: int) -> List[str]:
     """
     Build token n-grams (sliding window of size n) to keep local context.
@@ -1,7 +1,11 @@
-from typing import List
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, Tuple
+from profiling import count, timed
 from utils import tokenize_code
 
 
+@timed("lcs_dp")
 def lcs(seq_a: List[str], seq_b: List[str]) -> int:
     """
     Counts the longest common subsequence between two sequences.
@@ -13,6 +17,7 @@ def lcs(seq_a: List[str], seq_b: List[str]) -> int:
     """
     m = len(seq_a)
     n = len(seq_b)
+    count("lcs_cells", m * n)
 
     dp = [[0] * (n + 1) for x in range(m + 1)]
 
@@ -25,8 +30,237 @@ def lcs(seq_a: List[str], seq_b: List[str]) -> int:
     return dp[m][n]
 
 
-def compute_lcs(code_1: str, code_2: str) -> float:
+def _unique_kgrams(seq: List[str], k: int) -> Dict[Tuple[str, ...], int]:
+    """
+    Maps every k-gram that occurs exactly once in seq to its position.
+    """
+    seen: Dict[Tuple[str, ...], int] = {}
+    repeated = set()
+    for i in range(len(seq) - k + 1):
+        gram = tuple(seq[i : i + k])
+        if gram in seen:
+            repeated.add(gram)
+        else:
+            seen[gram] = i
+    return {gram: i for gram, i in seen.items() if gram not in repeated}
+
+
+def _anchor_chain(
+    seq_a: List[str], seq_b: List[str], k: int
+) -> Tuple[List[Tuple[int, int]], float]:
+    """
+    Finds k-grams unique in both sequences and returns the longest chain of
+    them that appears in the same order in both (patience diff), as
+    non-overlapping (position_in_a, position_in_b) pairs, together with its
+    support: the fraction of the common unique k-grams that made it into the
+    chain. Shared code gives a support close to 1; chance matches between
+    unrelated low-entropy streams are scattered and give a low one.
+    """
+    unique_b = _unique_kgrams(seq_b, k)
+    pairs = sorted(
+        (i, unique_b[gram]) for gram, i in _unique_kgrams(seq_a, k).items() if gram in unique_b
+    )
+    if not pairs:
+        return [], 0.0
+
+    # longest increasing subsequence of the b positions
+    tails: List[int] = []
+    tails_idx: List[int] = []
+    prev = [-1] * len(pairs)
+    for idx, (_, j) in enumerate(pairs):
+        pos = bisect_left(tails, j)
+        if pos == len(tails):
+            tails.append(j)
+            tails_idx.append(idx)
+        else:
+            tails[pos] = j
+            tails_idx[pos] = idx
+        prev[idx] = tails_idx[pos - 1] if pos > 0 else -1
+
+    chain = []
+    idx = tails_idx[-1]
+    while idx != -1:
+        chain.append(pairs[idx])
+        idx = prev[idx]
+    chain.reverse()
+    support = len(chain) / len(pairs)
+
+    # overlapping anchors are dropped, their tokens end up in the next gap
+    result: List[Tuple[int, int]] = []
+    for i, j in chain:
+        if not result or (i >= result[-1][0] + k and j >= result[-1][1] + k):
+            result.append((i, j))
+    return result, support
+
+
+def _banded_lcs(seq_a: List[str], seq_b: List[str], max_cells: int, min_band: int = 16) -> int:
+    """
+    LCS restricted to a diagonal band of the DP table, in O(len(seq_b)) memory.
+
+    The band follows the line from (0, 0) to (m, n) and is as wide as
+    max_cells allows, but at least 2 * min_band + 1 cells. Cells outside the
+    band keep the value of an earlier row, which is still a valid lower bound,
+    so the result is the length of a real common subsequence.
+    """
+    if len(seq_a) < len(seq_b):
+        seq_a, seq_b = seq_b, seq_a
+    m, n = len(seq_a), len(seq_b)
+    half = max(min_band, max_cells // (2 * m))
+    count("lcs_cells", m * min(n, 2 * half + 1))
+
+    row = [0] * (n + 1)
+    for i in range(1, m + 1):
+        # m >= n, so the centre moves by at most one column per row
+        centre = i * n // m
+        lo = max(1, centre - half)
+        hi = min(n, centre + half)
+        token = seq_a[i - 1]
+        diag = left = row[lo - 1]
+        for j in range(lo, hi + 1):
+            up = row[j]
+            if token == seq_b[j - 1]:
+                left = diag + 1
+            elif up > left:
+                left = up
+            diag = up
+            row[j] = left
+    return row[n]
+
+
+def approximate_lcs(
+    seq_a: List[str],
+    seq_b: List[str],
+    k: int = 8,
+    max_cells: int = 250_000,
+    min_density: float = 0.02,
+    min_support: float = 0.3,
+) -> int:
+    """
+    Anchor-based approximation of the longest common subsequence.
+
+    Steps:
+    1. Strip the common prefix and suffix (this never loses matches).
+    2. If what is left fits into max_cells DP cells, run the exact lcs.
+    3. Otherwise find k-grams unique in both sequences, keep the longest chain
+       of them in the same order in both (patience diff), and recurse into the
+       gaps between consecutive anchors. A chain that covers less than
+       min_density of the shorter sequence, or keeps less than min_support of
+       the common unique k-grams, is treated as chance matches (common in
+       low-entropy token streams) and k is halved.
+    4. If no k yields a dense enough chain, fall back to a banded DP whose size
+       is bounded by max_cells (at least 33 cells per token), so memory stays
+       linear and time near-linear even then.
+
+    The result is the length of a real common subsequence, so it never exceeds
+    lcs(seq_a, seq_b); lcs_upper_bound gives the other side of the error bound.
+    On large files that share code the running time is close to linear.
+
+    Args:
+        seq_a (List[str]): The first sequence.
+        seq_b (List[str]): The second sequence.
+        k (int): Anchor length in tokens.
+        max_cells (int): Largest m * n that is handed to the exact DP.
+        min_density (float): Fraction of the shorter sequence the anchors must
+            cover to be trusted.
+        min_support (float): Fraction of the common unique k-grams the chain
+            must keep to be trusted.
+    Returns:
+        int: Length of a common subsequence, a lower bound on the exact LCS.
+    """
+    start = 0
+    limit = min(len(seq_a), len(seq_b))
+    while start < limit and seq_a[start] == seq_b[start]:
+        start += 1
+    end = 0
+    while end < limit - start and seq_a[-1 - end] == seq_b[-1 - end]:
+        end += 1
+    core_a = seq_a[start : len(seq_a) - end]
+    core_b = seq_b[start : len(seq_b) - end]
+    trimmed = start + end
+
+    if not core_a or not core_b:
+        return trimmed
+    if len(core_a) * len(core_b) <= max_cells:
+        return trimmed + lcs(core_a, core_b)
+
+    shorter = min(len(core_a), len(core_b))
+    while k >= 1:
+        chain, support = _anchor_chain(core_a, core_b, k)
+        if chain and support >= min_support and len(chain) * k >= min_density * shorter:
+            break
+        k //= 2
+    else:
+        # no reliable anchors, e.g. random-looking numeric tables
+        return trimmed + _banded_lcs(core_a, core_b, max_cells)
+
+    total = trimmed + len(chain) * k
+    prev_a = prev_b = 0
+    for i, j in chain + [(len(core_a), len(core_b))]:
+        total += approximate_lcs(
+            core_a[prev_a:i], core_b[prev_b:j], k, max_cells, min_density, min_support
+        )
+        prev_a, prev_b = i + k, j + k
+    return total
+
+
+def lcs_upper_bound(seq_a: List[str], seq_b: List[str]) -> int:
+    """
+    Cheap upper bound on the LCS length: a common subsequence cannot use a token
+    more often than it occurs in either sequence. Together with approximate_lcs
+    this brackets the exact value.
+    """
+    counts_a = Counter(seq_a)
+    counts_b = Counter(seq_b)
+    return sum(min(count, counts_b[token]) for token, count in counts_a.items())
+
+
+def normalized_lcs(
+    tokens_1: List[str],
+    tokens_2: List[str],
+    approximate: bool = False,
+    max_cells: int = 250_000,
+) -> float:
+    """
+    2 * LCS / (len1 + len2) of two token streams, 0.0 if either is empty.
+    With approximate=True, approximate_lcs is used with the given max_cells.
+    """
+    if not tokens_1 or not tokens_2:
+        return 0.0
+    if approximate:
+        common = approximate_lcs(tokens_1, tokens_2, max_cells=max_cells)
+    else:
+        common = lcs(tokens_1, tokens_2)
+    return (2.0 * common) / (len(tokens_1) + len(tokens_2))
+
+
+def compute_lcs(
+    code_1: str, code_2: str, cache=None, approximate: bool = False, base=None
+) -> float:
+    """
+    Normalized LCS similarity of two code snippets: 2 * LCS / (len1 + len2).
+    If a PairCache is given it is consulted before computing.
+    With approximate=True the anchor-based approximate_lcs is used, which
+    handles very large (generated or vendored) files in near-linear time and
+    can only underestimate the exact score.
+    If a BaseCode is given, tokens shared with the starter code are removed
+    from both snippets before comparing.
+    """
+    if cache is not None:
+        params = {"approximate": True} if approximate else {}
+        if base:
+            params["base"] = base.cache_key
+        return cache.get_or_compute(
+            "lcs",
+            params,
+            code_1,
+            code_2,
+            lambda: compute_lcs(code_1, code_2, approximate=approximate, base=base),
+        )
+    count("pairs")
     tok1 = tokenize_code(code_1)
     tok2 = tokenize_code(code_2)
+    if base:
+        tok1 = base.strip_tokens(tok1)
+        tok2 = base.strip_tokens(tok2)
     #return lcs(tok1, tok2)/len(tok1)
-    return (2.0 * lcs(tok1,tok2)) / (len(tok1) + len(tok2))
+    return normalized_lcs(tok1, tok2, approximate)
@@ -0,0 +1,126 @@
+import random
+import time
+
+import lcs
+from utils import tokenize_code
+
+merge_git = """
+void merge(vector<int>& arr, int left, int mid, int right) {
+    int n1 = mid - left + 1;
+    int n2 = right - mid;
+    vector<int> L(n1), R(n2);
+
+    for (int i = 0; i < n1; i++) L[i] = arr[left + i];
+    for (int j = 0; j < n2; j++) R[j] = arr[mid + 1 + j];
+
+    int i = 0, j = 0, k = left;
+    while (i < n1 && j < n2) {
+        if (L[i] <= R[j]) {
+            arr[k] = L[i]; i++;
+        } else {
+            arr[k] = R[j]; j++;
+        }
+        k++;
+    }
+    while (i < n1) { arr[k] = L[i]; i++; k++; }
+    while (j < n2) { arr[k] = R[j]; j++; k++; }
+}
+
+void mergeSort(vector<int>& arr, int left, int right) {
+    if (left >= right) return;
+    int mid = left + (right - left) / 2;
+    mergeSort(arr, left, mid);
+    mergeSort(arr, mid + 1, right);
+    merge(arr, left, mid, right);
+}
+"""
+
+
+def generated_file(copies: int, rng: random.Random) -> list:
+    """
+    Simulates generated code: the merge sort repeated with renamed identifiers.
+    """
+    tokens = []
+    for c in range(copies):
+        for tok in tokenize_code(merge_git):
+            if tok in ("merge", "mergeSort", "arr", "L", "R"):
+                tok = f"{tok}_{c}"
+            tokens.append(tok)
+    return tokens
+
+
+def mutate(tokens: list, rate: float, rng: random.Random) -> list:
+    """
+    Deletes, inserts or replaces roughly `rate` of the tokens.
+    """
+    result = []
+    for tok in tokens:
+        r = rng.random()
+        if r < rate / 3:
+            continue
+        if r < 2 * rate / 3:
+            result.append(tok)
+            result.append(rng.choice(["+", "0", "tmp", ";", "*"]))
+        elif r < rate:
+            result.append("x")
+        else:
+            result.append(tok)
+    return result
+
+
+def numeric_table(values: int, alphabet: int, rng: random.Random) -> list:
+    """
+    Simulates a low-entropy file, e.g. a generated lookup table: few distinct
+    tokens, so hardly any k-gram is unique.
+    """
+    tokens = ["table", "=", "["]
+    for _ in range(values):
+        tokens += [str(rng.randrange(alphabet)), ","]
+    return tokens + ["]"]
+
+
+def report(a: list, b: list, label):
+    t = time.perf_counter()
+    exact = lcs.lcs(a, b)
+    exact_time = time.perf_counter() - t
+
+    t = time.perf_counter()
+    approx = lcs.approximate_lcs(a, b)
+    approx_time = time.perf_counter() - t
+
+    bound = lcs.lcs_upper_bound(a, b)
+    error = 100.0 * (exact - approx) / exact
+    print(f"{len(a):>6}x{len(b):<7} {label:>5} {exact:>7} {approx:>7} {bound:>7} {error:>6.2f} {exact_time:>8.2f} {approx_time:>8.3f}")
+
+
+rng = random.Random(0)
+print(f"{'tokens':>14} {'rate':>5} {'exact':>7} {'approx':>7} {'bound':>7} {'err %':>6} {'exact s':>8} {'approx s':>8}")
+for copies, rate in [(5, 0.05), (10, 0.1), (10, 0.3), (20, 0.1)]:
+    a = generated_file(copies, rng)
+    report(a, mutate(a, rate, rng), rate)
+
+# low-entropy tables: unrelated ones (anchors are chance matches) and a
+# mutated copy; the rate column shows the alphabet size
+for alphabet in (2, 3, 16):
+    report(numeric_table(1500, alphabet, rng), numeric_table(1500, alphabet, rng), alphabet)
+table = numeric_table(1500, 3, rng)
+report(table, mutate(table, 0.1, rng), 3)
+
+# far beyond what the exact DP can handle
+a = generated_file(200, rng)
+b = mutate(a, 0.1, rng)
+t = time.perf_counter()
+approx = lcs.approximate_lcs(a, b)
+approx_time = time.perf_counter() - t
+bound = lcs.lcs_upper_bound(a, b)
+print(f"{len(a)}x{len(b)}: approx {approx}, upper bound {bound} "
+      f"(at most {100.0 * (bound - approx) / bound:.2f}% below exact), {approx_time:.2f}s")
+
+# the same size for unrelated low-entropy tables, where no anchor can be
+# trusted and the banded fallback has to keep time and memory bounded
+a = numeric_table(30000, 3, rng)
+b = numeric_table(30000, 3, rng)
+t = time.perf_counter()
+approx = lcs.approximate_lcs(a, b)
+approx_time = time.perf_counter() - t
+print(f"{len(a)}x{len(b)} low-entropy: approx {approx}, upper bound {lcs.lcs_upper_bound(a, b)}, {approx_time:.2f}s")
@@ -0,0 +1,132 @@
+"""Load test for the similarity service, reporting p50/p99 latency.
+
+Start the service first, then:
+    python load_test.py --url http://127.0.0.1:8000 --endpoint compare --requests 500 --concurrency 8
+
+Every client thread keeps one HTTP/1.1 connection open. Requests mutate the
+snippets slightly so that, unless --repeat is given, the pair cache is not hit.
+"""
+import argparse
+import http.client
+import json
+import statistics
+import threading
+import time
+from urllib.parse import urlparse
+
+merge = """
+def merge(arr, left, mid, right):
+    L = arr[left:mid + 1]
+    R = arr[mid + 1:right + 1]
+    i = j = 0
+    k = left
+    while i < len(L) and j < len(R):
+        if L[i] <= R[j]:
+            arr[k] = L[i]
+            i += 1
+        else:
+            arr[k] = R[j]
+            j += 1
+        k += 1
+    while i < len(L):
+        arr[k] = L[i]
+        i += 1
+        k += 1
+    while j < len(R):
+        arr[k] = R[j]
+        j += 1
+        k += 1
+
+
+def merge_sort(arr, left, right):
+    if left >= right:
+        return
+    mid = left + (right - left) // 2
+    merge_sort(arr, left, mid)
+    merge_sort(arr, mid + 1, right)
+    merge(arr, left, mid, right)
+"""
+
+
+def payload(endpoint: str, i: int, repeat: bool) -> dict:
+    suffix = "" if repeat else f"\nvalue_{i} = {i}\n"
+    if endpoint == "compare":
+        return {
+            "code_1": merge,
+            "code_2": merge.replace("arr", "data") + suffix,
+            "metrics": ["lcs", "jaccard"],
+        }
+    if endpoint == "batch":
+        return {
+            "codes": {f"s{j}.py": merge.replace("arr", f"a{j}") + suffix for j in range(5)},
+            "metrics": ["jaccard"],
+        }
+    if endpoint == "corpus/query":
+        return {"name": f"late_{i}.py", "code": merge + suffix, "add": False, "lcs_top": 3}
+    raise ValueError(f"unknown endpoint {endpoint}")
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test for service.py")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", choices=("compare", "batch", "corpus/query"), default="compare")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--repeat", action="store_true", help="send identical requests (cache hits)")
+    args = parser.parse_args(argv)
+
+    url = urlparse(args.url)
+    if args.endpoint == "corpus/query":
+        # make sure there is something to query against
+        conn = http.client.HTTPConnection(url.hostname, url.port)
+        codes = {f"seed_{time.time_ns()}_{j}.py": merge.replace("arr", f"x{j}") for j in range(20)}
+        conn.request("POST", "/corpus/add", json.dumps({"codes": codes}), {"Content-Type": "application/json"})
+        conn.getresponse().read()
+        conn.close()
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(args.requests))
+
+    def client():
+        conn = http.client.HTTPConnection(url.hostname, url.port)
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            body = json.dumps(payload(args.endpoint, i, args.repeat))
+            start = time.perf_counter()
+            conn.request("POST", "/" + args.endpoint, body, {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if response.status != 200:
+                    errors.append(response.status)
+        conn.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total = time.perf_counter() - start
+
+    ms = [x * 1000 for x in latencies]
+    print(f"{args.endpoint}: {len(ms)} requests, {args.concurrency} clients, {total:.2f}s, {len(ms) / total:.1f} req/s")
+    print(f"p50 {percentile(ms, 50):.1f} ms, p99 {percentile(ms, 99):.1f} ms, "
+          f"mean {statistics.mean(ms):.1f} ms, max {max(ms):.1f} ms, errors {len(errors)}")
+
+
+if __name__ == "__main__":
+    main()
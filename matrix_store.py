@@ -0,0 +1,266 @@
+import json
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from typing import Callable, Iterator, List, Tuple
+
+from cache import content_hash
+from lcs import compute_lcs
+from pool_worker import call, init_worker, state, unwrap
+from profiling import PROFILER
+
+FLOAT_SIZE = 4
+
+
+def _open_mapped(path: str, size: int) -> Tuple[int, mmap.mmap]:
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    if os.fstat(fd).st_size < size:
+        os.ftruncate(fd, size)
+    return fd, mmap.mmap(fd, size)
+
+
+class SimilarityMatrixStore:
+    """
+    Persistent all-pairs similarity matrix backed by memory-mapped files.
+
+    Only the strict upper triangle (i < j) is stored, as float32, in `path`.
+    The pair space is cut into square tiles of `block_size` x `block_size`
+    documents; `path + ".done"` is a bitmap with one bit per tile that is set
+    once the tile's scores have been flushed to disk. A run that gets killed
+    can therefore be resumed by computing only the tiles whose bit is unset.
+    Readers can query single rows without loading the whole matrix.
+
+    Files:
+        <path>       - float32 upper-triangular scores
+        <path>.done  - completion bitmap, one bit per tile
+        <path>.meta  - JSON with num_docs, block_size and, once run_all_pairs
+                       has started, a digest of the documents and the metric
+    """
+
+    def __init__(self, path: str, num_docs: int, block_size: int = 64):
+        if block_size < 1:
+            raise ValueError("block_size must be at least 1")
+        self.path = path
+        self.num_docs = num_docs
+        self.block_size = block_size
+        self._check_meta()
+
+        num_tiles = -(-num_docs // block_size)
+        self.block_list: List[Tuple[int, int]] = [
+            (bi, bj) for bi in range(num_tiles) for bj in range(bi, num_tiles)
+        ]
+        num_pairs = num_docs * (num_docs - 1) // 2
+        # mmap cannot map empty files
+        self._fd, self._mm = _open_mapped(path, max(num_pairs, 1) * FLOAT_SIZE)
+        self._scores = memoryview(self._mm).cast("f")
+        self._done_fd, self._done = _open_mapped(
+            path + ".done", max(-(-len(self.block_list) // 8), 1)
+        )
+
+    def _read_meta(self) -> dict:
+        with open(self.path + ".meta", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_meta(self, meta: dict):
+        with open(self.path + ".meta", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    def _check_meta(self):
+        meta = {"num_docs": self.num_docs, "block_size": self.block_size}
+        if os.path.exists(self.path + ".meta"):
+            stored = self._read_meta()
+            shape = {key: stored.get(key) for key in meta}
+            if shape != meta:
+                raise ValueError(
+                    f"{self.path} was created with {shape}, cannot reopen with {meta}"
+                )
+        else:
+            self._write_meta(meta)
+
+    def bind(self, codes_digest: str, metric: str):
+        """
+        Records which documents and metric the scores belong to, or checks
+        them against what an earlier run recorded, so a resumed run cannot
+        mix scores of different inputs in one matrix.
+
+        Raises:
+            ValueError: if the store holds scores of other documents or of
+                another metric.
+        """
+        meta = self._read_meta()
+        wanted = {"codes": codes_digest, "metric": metric}
+        stored = {key: meta[key] for key in wanted if key in meta}
+        if stored and stored != wanted:
+            raise ValueError(
+                f"{self.path} holds scores for {stored}, cannot resume with {wanted}"
+            )
+        if not stored:
+            meta.update(wanted)
+            self._write_meta(meta)
+
+    def _index(self, i: int, j: int) -> int:
+        if i > j:
+            i, j = j, i
+        return i * (2 * self.num_docs - i - 1) // 2 + (j - i - 1)
+
+    def set(self, i: int, j: int, score: float):
+        if i == j:
+            return
+        self._scores[self._index(i, j)] = score
+
+    def get(self, i: int, j: int) -> float:
+        if i == j:
+            return 1.0
+        return self._scores[self._index(i, j)]
+
+    def row(self, i: int) -> List[float]:
+        """
+        Returns:
+            List[float]: similarities of document i to every document
+            (1.0 on the diagonal).
+        """
+        return [self.get(i, j) for j in range(self.num_docs)]
+
+    def block_pairs(self, block_id: int) -> Iterator[Tuple[int, int]]:
+        """
+        Yields the (i, j) pairs with i < j covered by a tile.
+        """
+        bi, bj = self.block_list[block_id]
+        size = self.block_size
+        for i in range(bi * size, min((bi + 1) * size, self.num_docs)):
+            start = max(bj * size, i + 1)
+            for j in range(start, min((bj + 1) * size, self.num_docs)):
+                yield i, j
+
+    def is_done(self, block_id: int) -> bool:
+        return bool(self._done[block_id // 8] & (1 << (block_id % 8)))
+
+    def mark_done(self, block_id: int):
+        """
+        Flushes the scores to disk first, and only then sets the tile's bit,
+        so a set bit always refers to scores that survived on disk.
+        """
+        self._mm.flush()
+        self._done[block_id // 8] |= 1 << (block_id % 8)
+        self._done.flush()
+
+    def pending_blocks(self) -> List[int]:
+        return [b for b in range(len(self.block_list)) if not self.is_done(b)]
+
+    def is_complete(self) -> bool:
+        return not self.pending_blocks()
+
+    def flush(self):
+        self._mm.flush()
+        self._done.flush()
+
+    def close(self):
+        if self._mm.closed:
+            return
+        self.flush()
+        self._scores.release()
+        self._mm.close()
+        self._done.close()
+        os.close(self._fd)
+        os.close(self._done_fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _fill_block(store: SimilarityMatrixStore, codes: List[str], metric, block_id: int):
+    for i, j in store.block_pairs(block_id):
+        store.set(i, j, metric(codes[i], codes[j]))
+    store.flush()
+
+
+def _worker_block(block_id: int) -> int:
+    if "store" not in state:
+        # every worker maps the files once, on its first tile
+        state["store"] = SimilarityMatrixStore(*state["store_args"])
+    _fill_block(state["store"], state["codes"], state["metric"], block_id)
+    return block_id
+
+
+def codes_digest(codes: List[str]) -> str:
+    return content_hash("\n".join(content_hash(code) for code in codes))
+
+
+def metric_name(metric) -> str:
+    """
+    Stable description of a metric function, including the arguments bound
+    with functools.partial (a BaseCode is described by its cache_key).
+    """
+    if isinstance(metric, partial):
+        args = [metric_name(arg) for arg in metric.args]
+        args += [f"{key}={metric_name(value)}" for key, value in sorted(metric.keywords.items())]
+        return f"{metric_name(metric.func)}({', '.join(args)})"
+    if hasattr(metric, "cache_key"):
+        return metric.cache_key
+    if callable(metric):
+        return f"{metric.__module__}.{metric.__qualname__}"
+    return repr(metric)
+
+
+def run_all_pairs(
+    store: SimilarityMatrixStore,
+    codes: List[str],
+    metric: Callable[[str, str], float] = compute_lcs,
+    jobs: int = 1,
+    on_block: Callable[[int], None] | None = None,
+) -> int:
+    """
+    Fills `store` with metric scores for every pair of `codes`, skipping tiles
+    that are already marked done. Calling it again after a crash resumes
+    where the previous run stopped; resuming with other codes or another
+    metric raises ValueError.
+
+    With jobs > 1 every worker process maps the same files and writes its
+    tile directly to disk; only this process updates the completion bitmap.
+
+    Args:
+        store: SimilarityMatrixStore sized for len(codes) documents
+        codes: List[str] - code snippets, indexed like the matrix rows
+        metric: picklable function (code_1, code_2) -> float
+        jobs: int - number of worker processes
+        on_block: optional callback invoked with every finished tile id
+
+    Returns:
+        int: number of tiles computed by this call.
+    """
+    if len(codes) != store.num_docs:
+        raise ValueError("number of codes does not match the store size")
+    store.bind(codes_digest(codes), metric_name(metric))
+    pending = store.pending_blocks()
+
+    if jobs <= 1:
+        for block_id in pending:
+            _fill_block(store, codes, metric, block_id)
+            store.mark_done(block_id)
+            if on_block:
+                on_block(block_id)
+        return len(pending)
+
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=init_worker,
+        initargs=(
+            {
+                "store_args": (store.path, store.num_docs, store.block_size),
+                "codes": codes,
+                "metric": metric,
+            },
+            PROFILER.settings(),
+        ),
+    ) as pool:
+        futures = [pool.submit(call, _worker_block, b) for b in pending]
+        for future in as_completed(futures):
+            block_id = unwrap(future.result())
+            store.mark_done(block_id)
+            if on_block:
+                on_block(block_id)
+    return len(pending)
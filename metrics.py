@@ -0,0 +1,141 @@
+from itertools import combinations
+from typing import Callable, Dict, List, Tuple
+
+from cache import PairCache, canonical_pair, content_hash
+from jaccard import compute_jaccard_similarity
+from lcs import compute_lcs
+
+# name -> (function, default parameters)
+METRICS: Dict[str, Tuple[Callable[..., float], dict]] = {
+    "lcs": (compute_lcs, {}),
+    "jaccard": (compute_jaccard_similarity, {"n": 3}),
+}
+
+
+def get_metric(name: str) -> Tuple[Callable[..., float], dict]:
+    if name not in METRICS:
+        raise ValueError(f"unknown metric {name!r}, expected one of {sorted(METRICS)}")
+    return METRICS[name]
+
+
+def score_pair(
+    code_1: str, code_2: str, metrics: List[Tuple[str, Callable[..., float], dict]]
+) -> dict:
+    """
+    Scores one pair with several metrics. A metric that raises (e.g. Jaccard's
+    normalize_code on a file that is not Python) gets None, and its error is
+    reported under "error" instead of failing the whole pair.
+
+    Args:
+        metrics: (name, function, parameters) triples
+
+    Returns:
+        dict: {<metric>: score, ...} plus "error" if any metric failed
+    """
+    row = {}
+    errors = []
+    for name, func, params in metrics:
+        try:
+            row[name] = func(code_1, code_2, **params)
+        except Exception as e:
+            row[name] = None
+            errors.append(f"{name}: {type(e).__name__}: {e}")
+    if errors:
+        row["error"] = "; ".join(errors)
+    return row
+
+
+def parse_thresholds(names: List[str], values=None) -> Dict[str, float]:
+    """
+    Resolves the thresholds of the given metrics. Scores of different metrics
+    are on different scales, so each metric can have its own threshold.
+
+    Args:
+        names (List[str]): metrics being computed
+        values: a single score for every metric, a dict metric -> score, or a
+            list of "metric=score" / "score" strings as given on the command
+            line (a bare score applies to the metrics not named elsewhere)
+
+    Returns:
+        Dict[str, float]: metric -> threshold, 0.0 for metrics not given one
+    """
+    if values is None:
+        values = []
+    elif isinstance(values, dict):
+        values = [f"{name}={score}" for name, score in values.items()]
+    elif not isinstance(values, list):
+        values = [values]
+
+    default = 0.0
+    named: Dict[str, float] = {}
+    for value in values:
+        name, sep, score = str(value).rpartition("=")
+        try:
+            score = float(score)
+        except ValueError:
+            raise ValueError(f"invalid threshold {value!r}, expected SCORE or METRIC=SCORE") from None
+        if not sep:
+            default = score
+        elif name not in names:
+            raise ValueError(f"threshold for {name!r}, which is not one of the metrics {names}")
+        else:
+            named[name] = score
+    return {name: named.get(name, default) for name in names}
+
+
+def passes_threshold(row: dict, thresholds: Dict[str, float]) -> bool:
+    """
+    Returns:
+        bool: whether a row from score_pair should be reported, i.e. at least
+        one metric reaches its threshold. Pairs that could not be scored at
+        all are always reported.
+    """
+    scores = [(name, row[name]) for name in thresholds if row.get(name) is not None]
+    return not scores or any(score >= thresholds[name] for name, score in scores)
+
+
+def compare_all(
+    codes: Dict[str, str], metric: str = "lcs", cache: PairCache | None = None, **params
+) -> Dict[Tuple[str, str], float]:
+    """
+    Compares every pair of code snippets with one metric.
+
+    When a cache is given, all pairs are looked up in one bulk query first and
+    only the missing ones are computed, then stored in one bulk insert.
+
+    Args:
+        codes (Dict[str, str]): filename -> code
+        metric (str): name of a metric in METRICS
+        cache (PairCache | None): optional persistent pair cache
+        **params: metric parameters overriding the defaults (e.g. n=4)
+
+    Returns:
+        Dict[Tuple[str, str], float]: score for every (filename_a, filename_b) pair
+    """
+    func, defaults = get_metric(metric)
+    params = {**defaults, **params}
+    names = list(codes)
+    pairs = list(combinations(names, 2))
+
+    if cache is None:
+        return {(a, b): func(codes[a], codes[b], **params) for a, b in pairs}
+
+    hashes = {name: content_hash(codes[name]) for name in names}
+    cached = cache.get_many(metric, params, [(hashes[a], hashes[b]) for a, b in pairs])
+
+    results: Dict[Tuple[str, str], float] = {}
+    computed: Dict[Tuple[str, str], float] = {}
+    for a, b in pairs:
+        key = canonical_pair(hashes[a], hashes[b])
+        if key in cached:
+            results[(a, b)] = cached[key]
+        elif key in computed:
+            # identical files submitted under different names
+            results[(a, b)] = computed[key]
+        else:
+            score = func(codes[a], codes[b], **params)
+            computed[key] = score
+            results[(a, b)] = score
+
+    cache.put_many(metric, params, [(*key, score) for key, score in computed.items()])
+    return results
@@ -48,10 +48,17 @@ class MossDetector:
         self.user_id = user_id
         self.options = {"l": "c", "m": 10, "d": 0, "x": 0, "c": "", "n": 250}
         self.codes = []
+        self.base_files = []
 
         if language in self.languages:
             self.options["l"] = language
 
+    @staticmethod
+    def _as_text(code) -> str:
+        if not isinstance(code, (str, bytes)):
+            raise TypeError("code must be str or bytes")
+        return code if isinstance(code, str) else code.decode("utf-8", "ignore")
+
     def add_code_snippet(self, code: str, filename: str | None = None):
         """
         Adds a code snippet to the list for later submission.
@@ -67,10 +74,23 @@ class MossDetector:
         Raises:
             TypeError: If 'code' is not an instance of str or bytes.
         """
-        if not isinstance(code, (str, bytes)):
-            raise TypeError("code must be str or bytes")
-        text = code if isinstance(code, str) else code.decode("utf-8", "ignore")
-        self.codes.append((filename, text))
+        self.codes.append((filename, self._as_text(code)))
+
+    def add_base_file(self, code: str, filename: str | None = None):
+        """
+        Adds starter (skeleton) code that every student received.
+
+        MOSS ignores matches against base files, so code shared by all
+        submissions only because it was handed out does not inflate scores.
+
+        Args:
+            code (str | bytes): The source code of the base file.
+            filename (str | None): An optional display name for the file.
+
+        Raises:
+            TypeError: If 'code' is not an instance of str or bytes.
+        """
+        self.base_files.append((filename or f"base_{len(self.base_files)}", self._as_text(code)))
 
     def upload_string(self, sock, code: str, filename: str, index: int):
         """
@@ -97,34 +117,41 @@ class MossDetector:
         response, which is the URL to the results.
         """
         s = socket.socket()
-        s.connect((self.server, self.port))
-
-        def w(msg):
-            s.send(msg.encode("utf-8"))
-
-        w(f"moss {self.user_id}\n")
-        w(f"directory {self.options['d']}\n")
-        w(f"X {self.options['x']}\n")
-        w(f"maxmatches {self.options['m']}\n")
-        w(f"show {self.options['n']}\n")
-
-        w(f"language {self.options['l']}\n")
-        recv = s.recv(1024).decode()
-
-        if recv.startswith("no"):
+        try:
+            s.connect((self.server, self.port))
+
+            def w(msg):
+                s.send(msg.encode("utf-8"))
+
+            w(f"moss {self.user_id}\n")
+            w(f"directory {self.options['d']}\n")
+            w(f"X {self.options['x']}\n")
+            w(f"maxmatches {self.options['m']}\n")
+            w(f"show {self.options['n']}\n")
+
+            w(f"language {self.options['l']}\n")
+            recv = s.recv(1024).decode()
+
+            if recv.startswith("no"):
+                w("end\n")
+                raise Exception("send() => Language not accepted by server")
+
+            # base files are always sent with index 0
+            for filename, code in self.base_files:
+                self.upload_string(s, code, filename, 0)
+
+            index = 1
+            for filename, code in self.codes:
+                self.upload_string(s, code, filename, index)
+                if on_send:
+                    on_send(filename, filename)
+                index += 1
+            w(f"query 0 {self.options['c']}\n")
+            response = s.recv(1024)
             w("end\n")
+        finally:
+            # also on errors, so retried queries do not leak connections
             s.close()
-            raise Exception("send() => Language not accepted by server")
-
-        index = 1
-        for filename, code in self.codes:
-            self.upload_string(s, code, filename, index)
-            if on_send:
-                on_send(filename, filename)
-            index += 1
-        w(f"query 0 {self.options['c']}\n")
-        response = s.recv(1024)
-        w("end\n")
 
         return response.decode().strip()
 
@@ -147,14 +174,17 @@ class MossDetector:
         return moss_id
 
     @classmethod
-    def compute_similarity(cls, code_1: str, code_2: str, lang: str = "python", filename1="first_solution.py", filename2="second_solution.py"):
+    def compute_similarity(cls, code_1: str, code_2: str, lang: str = "python", filename1="first_solution.py", filename2="second_solution.py", base_files: dict | None = None):
         """
         Computes similarity between two code strings using MOSS.
         - Initializes the detector
+        - Adds base files (filename -> code), if any
         - Adds both code strings
         - Sends them to MOSS for comparison
         """
         m = cls(user_id=cls.get_moss_user_id(), language=lang)
+        for filename, code in (base_files or {}).items():
+            m.add_base_file(code, filename)
         m.add_code_snippet(code_1, filename1)
         m.add_code_snippet(code_2, filename2)
 
@@ -163,13 +193,16 @@ class MossDetector:
     # TODO Implement a method that will get users solutions and store them into a map
     # where key is users id and value is a code casted to the string and this map can be passed to the 'compute_similarity_batch'
     @classmethod
-    def compute_similarity_batch(cls, codes_dict: dict, lang: str = "python"):
+    def compute_similarity_batch(cls, codes_dict: dict, lang: str = "python", base_files: dict | None = None):
         """
         This method compares series of code snippets using MOSS.
         This is preferred method for comparing n>2 snippets.
+        Starter code can be passed as base_files (filename -> code).
         """
         user_id = cls.get_moss_user_id()
         m = cls(user_id=user_id, language=lang)
+        for filename, code in (base_files or {}).items():
+            m.add_base_file(code, filename)
         for filename, code in codes_dict.items():
             m.add_code_snippet(code, filename)
 
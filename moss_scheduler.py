@@ -0,0 +1,163 @@
+import html
+import re
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import combinations
+from typing import Dict, List
+
+from moss import MossDetector
+
+# one row of the MOSS results table:
+# <TR><TD><A HREF="...match0.html">a.py (45%)</A>
+#     <TD><A HREF="...match0.html">b.py (40%)</A>
+# <TD ALIGN=right>12
+REPORT_ROW = re.compile(
+    r'<TR><TD><A HREF="(?P<url>[^"]+)">(?P<file_1>.+?) \((?P<percent_1>\d+)%\)</A>\s*'
+    r'<TD><A HREF="[^"]+">(?P<file_2>.+?) \((?P<percent_2>\d+)%\)</A>\s*'
+    r"<TD ALIGN=right>(?P<lines>\d+)",
+    re.IGNORECASE,
+)
+
+
+def partition_queries(names: List[str], max_files: int) -> List[List[str]]:
+    """
+    Splits a corpus into overlapping MOSS queries of at most max_files files
+    such that every pair of files is submitted together at least once.
+
+    The corpus is cut into parts of max_files // 2 files and every query is the
+    union of two parts, so p parts give p * (p - 1) / 2 queries.
+
+    Args:
+        names (List[str]): filenames of the whole corpus.
+        max_files (int): largest number of files sent in one query (>= 2).
+
+    Returns:
+        List[List[str]]: filenames of every query.
+    """
+    if max_files < 2:
+        raise ValueError("max_files must be at least 2")
+    if len(names) <= max_files:
+        return [list(names)]
+    size = max_files // 2
+    parts = [names[i : i + size] for i in range(0, len(names), size)]
+    return [a + b for a, b in combinations(parts, 2)]
+
+
+def parse_report(page: str) -> List[dict]:
+    """
+    Parses the MOSS results page into one dict per matched pair.
+
+    Returns:
+        List[dict]: {"file_1", "file_2", "percent_1", "percent_2", "lines", "url"}
+    """
+    return [
+        {
+            "file_1": html.unescape(m.group("file_1")),
+            "file_2": html.unescape(m.group("file_2")),
+            "percent_1": int(m.group("percent_1")),
+            "percent_2": int(m.group("percent_2")),
+            "lines": int(m.group("lines")),
+            "url": m.group("url"),
+        }
+        for m in REPORT_ROW.finditer(page)
+    ]
+
+
+def fetch_report(url: str, timeout: float = 60.0) -> str:
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read().decode("utf-8", "ignore")
+
+
+class MossScheduler:
+    """
+    Runs a corpus that is too large for a single MOSS query.
+
+    The corpus is partitioned into overlapping queries (see partition_queries),
+    which are sent with bounded concurrency and retried with exponential
+    backoff. The per-pair results of all queries are merged into one ranking;
+    a pair reported by several queries keeps its highest-scoring entry.
+
+    Example:
+        >>> scheduler = MossScheduler(codes_dict, lang="cc", max_files=100)
+        >>> ranking = scheduler.run()
+        >>> ranking[0]
+        {'file_1': 'a.cc', 'file_2': 'b.cc', 'percent_1': 91, ...}
+    """
+
+    def __init__(
+        self,
+        codes: Dict[str, str],
+        lang: str = "python",
+        max_files: int = 100,
+        concurrency: int = 4,
+        retries: int = 3,
+        backoff: float = 2.0,
+        base_files: Dict[str, str] | None = None,
+        user_id: str | None = None,
+        server: str | None = None,
+        port: int | None = None,
+    ):
+        self.codes = codes
+        self.lang = lang
+        self.max_files = max_files
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.base_files = base_files or {}
+        self.user_id = user_id
+        self.server = server
+        self.port = port
+
+    def _detector(self) -> MossDetector:
+        m = MossDetector(self.user_id or MossDetector.get_moss_user_id(), self.lang)
+        if self.server:
+            m.server = self.server
+        if self.port:
+            m.port = self.port
+        return m
+
+    def run_query(self, names: List[str]) -> List[dict]:
+        """
+        Sends one query and returns its parsed pairs, retrying on failure.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                m = self._detector()
+                for filename, code in self.base_files.items():
+                    m.add_base_file(code, filename)
+                for name in names:
+                    m.add_code_snippet(self.codes[name], name)
+                url = m.send()
+                if not url.startswith("http"):
+                    raise RuntimeError(f"MOSS did not return a report URL: {url!r}")
+                return parse_report(fetch_report(url))
+            except Exception:
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * 2**attempt)
+        return []
+
+    def run(self) -> List[dict]:
+        """
+        Runs every query and merges the results.
+
+        Returns:
+            List[dict]: de-duplicated pairs, most similar first.
+        """
+        queries = partition_queries(list(self.codes), self.max_files)
+        best: Dict[tuple, dict] = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = [pool.submit(self.run_query, names) for names in queries]
+            for future in as_completed(futures):
+                for pair in future.result():
+                    key = tuple(sorted((pair["file_1"], pair["file_2"])))
+                    score = max(pair["percent_1"], pair["percent_2"])
+                    current = best.get(key)
+                    if current is None or score > max(current["percent_1"], current["percent_2"]):
+                        best[key] = pair
+        return sorted(
+            best.values(),
+            key=lambda p: (max(p["percent_1"], p["percent_2"]), p["lines"]),
+            reverse=True,
+        )
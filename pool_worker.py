@@ -0,0 +1,93 @@
+"""Per-process state shared by the process pools of the batch tools.
+
+A pool is started with `initializer=init_worker, initargs=(values,
+PROFILER.settings())`; the module-level task functions then read what they need
+from `state` instead of receiving the documents with every task.
+
+Tasks submitted through call() send the profiling numbers the worker recorded
+back with their result, and unwrap() merges them into the parent's PROFILER,
+so stages and counters of work done in the pool are not lost.
+"""
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from profiling import PROFILER
+
+# per-process state of pool workers, filled in by init_worker
+state: Dict[str, Any] = {}
+
+
+def init_worker(values: Dict[str, Any], profile: Tuple[bool, bool] | None = None):
+    """
+    Args:
+        values: stored in `state`
+        profile: PROFILER.settings() of the parent; None leaves the profiler
+            alone (when the "worker" is the parent process itself)
+    """
+    state.clear()
+    state.update(values)
+    if profile is not None:
+        # a forked worker inherits numbers the parent reports itself
+        PROFILER.reset()
+        enabled, trace_memory = profile
+        if enabled:
+            PROFILER.enable(trace_memory)
+        else:
+            PROFILER.disable()
+
+
+def call(func: Callable, *args) -> Tuple[Any, dict | None]:
+    """
+    Runs in a pool worker: func(*args) and the profile recorded since the
+    previous task, if profiling is on.
+    """
+    result = func(*args)
+    return result, PROFILER.take() if PROFILER.enabled else None
+
+
+def unwrap(value: Tuple[Any, dict | None]) -> Any:
+    """
+    Merges the profile sent back by call() and returns the task's result.
+    """
+    result, profile = value
+    if profile:
+        PROFILER.merge(profile)
+    return result
+
+
+def imap_bounded(
+    pool: Executor,
+    func: Callable[[List[Any]], List[Any]],
+    items: Iterable[Any],
+    chunksize: int,
+    max_pending: int,
+) -> Iterator[Any]:
+    """
+    Maps func over chunks of items in the pool, yielding results in
+    completion order.
+
+    Unlike Pool.imap_unordered, which consumes its whole input up front, at
+    most max_pending chunks are in flight, so a lazy iterable of N^2 pairs is
+    only read as fast as the workers get through it.
+
+    Args:
+        pool: executor running func
+        func: picklable function taking a list of items, returning a list of results
+        items: input, consumed lazily
+        chunksize: items per task
+        max_pending: tasks submitted but not yet collected
+    """
+    items = iter(items)
+    pending = set()
+    while True:
+        while len(pending) < max_pending:
+            chunk = list(islice(items, chunksize))
+            if not chunk:
+                break
+            pending.add(pool.submit(call, func, chunk))
+        if not pending:
+            return
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield from unwrap(future.result())
@@ -0,0 +1,262 @@
+import functools
+import json
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+from typing import Dict, List
+
+_NULL = nullcontext()
+
+
+class _Stage:
+    """
+    Context manager measuring one execution of a stage.
+    """
+
+    __slots__ = ("profiler", "name", "start", "mem_start", "mem_peak")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        stack = self.profiler._stack
+        if self.profiler.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # keep the peak seen so far by the enclosing stage
+                stack[-1].mem_peak = max(stack[-1].mem_peak, peak)
+            tracemalloc.reset_peak()
+            self.mem_start = current
+            self.mem_peak = current
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        profiler = self.profiler
+        stack = profiler._stack
+        stack.pop()
+        with profiler._lock:
+            profiler._record(self.name, 1, elapsed, elapsed)
+
+            if profiler.trace_memory:
+                peak = max(self.mem_peak, tracemalloc.get_traced_memory()[1])
+                used = peak - self.mem_start
+                profiler.peak_memory[self.name] = max(profiler.peak_memory.get(self.name, 0), used)
+                if stack:
+                    stack[-1].mem_peak = max(stack[-1].mem_peak, peak)
+        return False
+
+
+class Profiler:
+    """
+    Per-stage timers and counters for the comparison pipeline.
+
+    Disabled by default: stage() then returns a shared no-op context manager
+    and count() returns immediately, so the hooks can stay in production code.
+
+    Stage nesting is tracked per thread. tracemalloc is process-wide, though,
+    so with trace_memory the peaks of stages running concurrently in several
+    threads include each other's allocations. Process pools report their
+    workers' numbers through merge(), see pool_worker.
+
+    Example:
+        >>> PROFILER.enable(trace_memory=True)
+        >>> compute_lcs(code_1, code_2)
+        >>> print(PROFILER.to_prometheus())
+        >>> PROFILER.to_json("profile.json")
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_memory = False
+        self.timings: Dict[str, List] = {}
+        self.counters: Dict[str, int] = {}
+        self.peak_memory: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def _stack(self) -> List[_Stage]:
+        """
+        Stages currently open in the calling thread.
+        """
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, name: str, calls: int, seconds: float, longest: float):
+        stats = self.timings.get(name)
+        if stats is None:
+            stats = self.timings[name] = [0, 0.0, 0.0]
+        stats[0] += calls
+        stats[1] += seconds
+        stats[2] = max(stats[2], longest)
+
+    def settings(self) -> tuple:
+        """
+        (enabled, trace_memory), to start worker processes in the same mode.
+        """
+        return self.enabled, self.trace_memory
+
+    def enable(self, trace_memory: bool = False):
+        """
+        Args:
+            trace_memory (bool): also record the peak memory allocated inside
+                every stage using tracemalloc (which slows Python down noticeably).
+        """
+        self.enabled = True
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self):
+        self.enabled = False
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.trace_memory = False
+
+    def reset(self):
+        with self._lock:
+            self.timings.clear()
+            self.counters.clear()
+            self.peak_memory.clear()
+
+    def merge(self, data: dict):
+        """
+        Adds metrics collected elsewhere, e.g. to_dict() of a worker process.
+        """
+        with self._lock:
+            for name, stats in data.get("stages", {}).items():
+                self._record(name, stats["calls"], stats["seconds"], stats["max_seconds"])
+                if "peak_memory_bytes" in stats:
+                    self.peak_memory[name] = max(
+                        self.peak_memory.get(name, 0), stats["peak_memory_bytes"]
+                    )
+            for name, value in data.get("counters", {}).items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def take(self) -> dict:
+        """
+        Returns to_dict() and resets, so the same numbers are never reported twice.
+        """
+        with self._lock:
+            data = self._to_dict()
+            self.timings.clear()
+            self.counters.clear()
+            self.peak_memory.clear()
+        return data
+
+    def stage(self, name: str):
+        """
+        Context manager timing the enclosed block under `name`.
+        """
+        if not self.enabled:
+            return _NULL
+        return _Stage(self, name)
+
+    def timed(self, name: str):
+        """
+        Decorator timing every call of the decorated function under `name`.
+        """
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Stage(self, name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def count(self, name: str, value: int = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return self._to_dict()
+
+    def _to_dict(self) -> dict:
+        return {
+            "stages": {
+                name: {
+                    "calls": calls,
+                    "seconds": total,
+                    "max_seconds": longest,
+                    **(
+                        {"peak_memory_bytes": self.peak_memory[name]}
+                        if name in self.peak_memory
+                        else {}
+                    ),
+                }
+                for name, (calls, total, longest) in self.timings.items()
+            },
+            "counters": dict(self.counters),
+        }
+
+    def to_json(self, path: str | None = None) -> str:
+        """
+        Returns the collected metrics as JSON, also writing them to `path` if given.
+        """
+        text = json.dumps(self.to_dict(), indent=2)
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        return text
+
+    def to_prometheus(self, prefix: str = "mosscheat") -> str:
+        """
+        Returns the collected metrics in the Prometheus text exposition format.
+        """
+
+        def metric_name(name: str) -> str:
+            return re.sub(r"[^a-zA-Z0-9_]", "_", f"{prefix}_{name}")
+
+        def label(name: str) -> str:
+            return name.replace("\\", "\\\\").replace('"', '\\"')
+
+        with self._lock:
+            timings = {name: list(stats) for name, stats in self.timings.items()}
+            peak_memory = dict(self.peak_memory)
+            counters = dict(self.counters)
+
+        lines = []
+        families = [
+            ("stage_calls_total", "counter", "Number of executions of a stage", 0),
+            ("stage_seconds_total", "counter", "Total time spent in a stage", 1),
+            ("stage_seconds_max", "gauge", "Longest single execution of a stage", 2),
+        ]
+        for suffix, kind, help_text, column in families:
+            lines.append(f"# HELP {metric_name(suffix)} {help_text}")
+            lines.append(f"# TYPE {metric_name(suffix)} {kind}")
+            for name, stats in timings.items():
+                lines.append(f'{metric_name(suffix)}{{stage="{label(name)}"}} {stats[column]}')
+        if peak_memory:
+            suffix = metric_name("stage_peak_memory_bytes")
+            lines.append(f"# HELP {suffix} Peak memory allocated inside a stage")
+            lines.append(f"# TYPE {suffix} gauge")
+            for name, peak in peak_memory.items():
+                lines.append(f'{suffix}{{stage="{label(name)}"}} {peak}')
+        for name, value in counters.items():
+            counter = metric_name(f"{name}_total")
+            lines.append(f"# TYPE {counter} counter")
+            lines.append(f"{counter} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# process-wide profiler used by the library's hooks
+PROFILER = Profiler()
+stage = PROFILER.stage
+timed = PROFILER.timed
+count = PROFILER.count
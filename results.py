@@ -0,0 +1,226 @@
+import heapq
+import json
+from typing import Dict, Hashable, Iterator, List, Tuple
+
+
+class TopKSink:
+    """
+    Keeps only the k most similar partners of every document.
+
+    Instead of storing the dense N x N result of an all-pairs run, every
+    document owns a bounded min-heap of at most k (score, partner) entries.
+    When the heap is full a new pair only gets in if it beats the weakest
+    entry, so memory stays O(N * k) regardless of how many pairs are fed in.
+
+    Example:
+        >>> sink = TopKSink(k=2)
+        >>> sink.add("a.py", "b.py", 0.9)
+        >>> sink.add("a.py", "c.py", 0.4)
+        >>> sink.neighbours("a.py")
+        [('b.py', 0.9), ('c.py', 0.4)]
+    """
+
+    def __init__(self, k: int = 10):
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        self.k = k
+        self.heaps: Dict[Hashable, List[Tuple[float, int, Hashable]]] = {}
+        # tie breaker, so heapq never has to compare document ids
+        self._counter = 0
+
+    def _push(self, doc: Hashable, partner: Hashable, score: float):
+        heap = self.heaps.setdefault(doc, [])
+        self._counter += 1
+        entry = (score, self._counter, partner)
+        if len(heap) < self.k:
+            heapq.heappush(heap, entry)
+        elif score > heap[0][0]:
+            heapq.heapreplace(heap, entry)
+
+    def add(self, doc_a: Hashable, doc_b: Hashable, score: float):
+        """
+        Record a similarity score for a pair of documents.
+        The pair is symmetric, so it is offered to the heaps of both documents.
+        """
+        self._push(doc_a, doc_b, score)
+        self._push(doc_b, doc_a, score)
+
+    def neighbours(self, doc: Hashable) -> List[Tuple[Hashable, float]]:
+        """
+        Returns:
+            List[Tuple[Hashable, float]]: up to k (partner, score) pairs,
+            most similar first.
+        """
+        heap = self.heaps.get(doc, [])
+        return [(partner, score) for score, _, partner in sorted(heap, reverse=True)]
+
+    def items(self) -> Iterator[Tuple[Hashable, List[Tuple[Hashable, float]]]]:
+        for doc in self.heaps:
+            yield doc, self.neighbours(doc)
+
+
+class UnionFind:
+    """
+    Disjoint-set forest with path halving and union by size.
+    Documents are added lazily the first time they are seen.
+    """
+
+    def __init__(self):
+        self.parent: Dict[Hashable, Hashable] = {}
+        self.size: Dict[Hashable, int] = {}
+
+    def find(self, x: Hashable) -> Hashable:
+        if x not in self.parent:
+            self.parent[x] = x
+            self.size[x] = 1
+            return x
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a: Hashable, b: Hashable) -> bool:
+        """
+        Merge the sets containing a and b.
+
+        Returns:
+            bool: True if two different sets were merged.
+        """
+        root_a = self.find(a)
+        root_b = self.find(b)
+        if root_a == root_b:
+            return False
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+        del self.size[root_b]
+        return True
+
+    def groups(self) -> Dict[Hashable, List[Hashable]]:
+        result: Dict[Hashable, List[Hashable]] = {}
+        for x in self.parent:
+            result.setdefault(self.find(x), []).append(x)
+        return result
+
+
+def _json_default(value):
+    # numpy scalars, e.g. the row/column indices of cosine_similarity_blocks
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class ClusterBuilder:
+    """
+    Streaming clustering of documents connected by edges above a threshold.
+
+    Every pair scoring at least `threshold` joins the two documents in a
+    union-find structure. If `edges_path` is given, accepted edges are
+    written to that file (one JSON object per line) as soon as they arrive,
+    with "merged": true on the edges that joined two clusters. The file is
+    therefore the clustering itself, kept up to date on disk: a run that dies
+    can be turned into clusters with load_clusters(edges_path). The file is
+    truncated when the builder is created, so a rerun does not repeat edges.
+    """
+
+    def __init__(self, threshold: float, edges_path: str | None = None):
+        self.threshold = threshold
+        self.uf = UnionFind()
+        self._edges = open(edges_path, "w", encoding="utf-8") if edges_path else None
+
+    def add(self, doc_a: Hashable, doc_b: Hashable, score: float):
+        if score < self.threshold:
+            return
+        merged = self.uf.union(doc_a, doc_b)
+        if self._edges is not None:
+            self._edges.write(
+                json.dumps(
+                    {"a": doc_a, "b": doc_b, "score": score, "merged": merged},
+                    default=_json_default,
+                )
+                + "\n"
+            )
+            self._edges.flush()
+
+    def clusters(self, min_size: int = 2) -> Iterator[List[Hashable]]:
+        """
+        Yields every cluster with at least `min_size` documents.
+        """
+        for members in self.uf.groups().values():
+            if len(members) >= min_size:
+                yield members
+
+    def write_clusters(self, path: str, min_size: int = 2) -> int:
+        """
+        Writes clusters to `path`, one JSON list per line.
+
+        Returns:
+            int: number of clusters written.
+        """
+        count = 0
+        with open(path, "w", encoding="utf-8") as f:
+            for members in self.clusters(min_size):
+                f.write(json.dumps(members, default=_json_default) + "\n")
+                count += 1
+        return count
+
+    def close(self):
+        if self._edges is not None:
+            self._edges.close()
+            self._edges = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_clusters(edges_path: str, min_size: int = 2) -> List[List[Hashable]]:
+    """
+    Rebuilds the clusters of a ClusterBuilder from its edges file, e.g. after
+    the run that wrote it was killed. A truncated last line is ignored.
+    """
+    uf = UnionFind()
+    with open(edges_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                edge = json.loads(line)
+            except ValueError:
+                break
+            if edge.get("merged", True):
+                uf.union(edge["a"], edge["b"])
+    return [members for members in uf.groups().values() if len(members) >= min_size]
+
+
+class SimilaritySink:
+    """
+    Result sink for all-pairs runs: feeds each scored pair both into a
+    TopKSink and a ClusterBuilder, so nothing N x N is ever materialized.
+
+    Example:
+        >>> sink = SimilaritySink(k=5, threshold=0.8)
+        >>> for (a, b), score in scores:
+        ...     sink.add(a, b, score)
+        >>> sink.clusters.write_clusters("clusters.jsonl")
+    """
+
+    def __init__(self, k: int = 10, threshold: float = 0.8, edges_path: str | None = None):
+        self.top_k = TopKSink(k)
+        self.clusters = ClusterBuilder(threshold, edges_path)
+        self.pairs = 0
+
+    def add(self, doc_a: Hashable, doc_b: Hashable, score: float):
+        self.pairs += 1
+        self.top_k.add(doc_a, doc_b, score)
+        self.clusters.add(doc_a, doc_b, score)
+
+    def close(self):
+        self.clusters.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,467 @@
+"""Long-running similarity HTTP service.
+
+Usage:
+    python -m service --port 8000 --jobs 4 --cache scores.sqlite --corpus corpus.pkl
+
+Endpoints (JSON in, JSON out):
+    GET  /health
+    GET  /metrics        profiling numbers in Prometheus text format (--profile)
+    POST /compare        {"code_1", "code_2", "metrics": ["lcs", "jaccard"], "n": 3}
+    POST /batch          {"codes": {name: code}, "metrics": [...], "threshold": 0.0 or {metric: score}}
+    POST /corpus/add     {"codes": {name: code}}
+    POST /corpus/query   {"name", "code", "add": true, "lcs_top": 10, "threshold": 0.0}
+    POST /moss           {"codes": {name: code}, "lang": "python"}
+
+The pair cache, the preprocessed form of recently seen documents (token
+streams, n-gram sets) and the corpus stay warm in memory. Preprocessing and
+scoring run in a process pool, corpus lookups and pair cache reads and writes
+in threads, so the event loop keeps serving. A metric that fails on a pair (e.g. Jaccard on code that
+is not Python) yields None and an "error" entry instead of failing the request.
+"""
+import argparse
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import combinations
+from typing import Any, Dict, List, Tuple
+
+from cache import PairCache, canonical_pair, content_hash
+from corpus import LCS_MAX_CELLS, Corpus, Document
+from jaccard import jaccard_index, ngram_set
+from lcs import normalized_lcs
+from metrics import get_metric, parse_thresholds, passes_threshold
+from moss import MossDetector
+from pool_worker import call, init_worker, state, unwrap
+from profiling import PROFILER
+from utils import tokenize_code
+
+MAX_BODY = 64 * 1024 * 1024
+MAX_FEATURES = 20_000
+
+# metric name -> (preprocessing of one document, score of two preprocessed
+# documents); both run in pool workers
+FEATURES = {
+    "lcs": (tokenize_code, normalized_lcs),
+    "jaccard": (ngram_set, jaccard_index),
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _error(e: Exception) -> str:
+    return f"{type(e).__name__}: {e}"
+
+
+def _prepare(metric: str, params: dict, codes: List[str]) -> List[Tuple[Any, str | None]]:
+    """
+    Runs in a pool worker: preprocesses a chunk of documents for one metric.
+
+    Returns:
+        (feature, None) or (None, error message) for every document
+    """
+    prepare = FEATURES[metric][0]
+    result = []
+    for code in codes:
+        try:
+            result.append((prepare(code, **params), None))
+        except Exception as e:
+            result.append((None, _error(e)))
+    return result
+
+
+def _score_features(
+    metric: str, pairs: List[Tuple[Any, Any]]
+) -> List[Tuple[float | None, str | None]]:
+    """
+    Runs in a pool worker: scores a chunk of pairs of preprocessed documents.
+    """
+    score = FEATURES[metric][1]
+    result = []
+    for feature_1, feature_2 in pairs:
+        try:
+            result.append((score(feature_1, feature_2), None))
+        except Exception as e:
+            result.append((None, _error(e)))
+    return result
+
+
+def _preprocess_documents(items: List[Tuple[str, str]]) -> List[Document]:
+    """
+    Runs in a pool worker: builds corpus documents with the parameters the
+    pool was started with.
+    """
+    corpus = state["corpus"]
+    return [corpus.preprocess(name, code) for name, code in items]
+
+
+def _lcs_scores(tokens: List[str], others: List[List[str]]) -> List[float]:
+    """
+    Runs in a pool worker: normalized LCS of one token stream against several,
+    approximated like Corpus.query does.
+    """
+    return [normalized_lcs(tokens, other, True, LCS_MAX_CELLS) for other in others]
+
+
+class SimilarityService:
+    """
+    Request handlers on top of compute_lcs, compute_jaccard_similarity,
+    Corpus and MossDetector, sharing one warm cache and corpus.
+    """
+
+    def __init__(self, pool: ProcessPoolExecutor, jobs: int, cache: PairCache, corpus: Corpus):
+        self.pool = pool
+        self.jobs = jobs
+        self.cache = cache
+        # one thread owns every PairCache call, so SQLite is never used concurrently
+        self.cache_thread = ThreadPoolExecutor(max_workers=1)
+        self.corpus = corpus
+        # corpus.query runs in a thread; it must not see a half-added document
+        self.corpus_lock = asyncio.Lock()
+        # (metric, params, content hash) -> (feature, error), least recently used first
+        self.features: OrderedDict = OrderedDict()
+        self.routes = {
+            ("GET", "/health"): self.health,
+            ("GET", "/metrics"): self.metrics,
+            ("POST", "/compare"): self.compare,
+            ("POST", "/batch"): self.batch,
+            ("POST", "/corpus/add"): self.corpus_add,
+            ("POST", "/corpus/query"): self.corpus_query,
+            ("POST", "/moss"): self.moss,
+        }
+
+    @staticmethod
+    def _metrics(body: dict) -> List[Tuple[str, dict]]:
+        names = body.get("metrics") or ["lcs"]
+        result = []
+        for name in names:
+            try:
+                defaults = get_metric(name)[1]
+            except ValueError as e:
+                raise HttpError(400, str(e))
+            params = dict(defaults)
+            if name == "jaccard" and "n" in body:
+                params["n"] = int(body["n"])
+            result.append((name, params))
+        return result
+
+    def _chunks(self, items: list) -> List[list]:
+        size = max(1, -(-len(items) // (self.jobs * 4)))
+        return [items[i : i + size] for i in range(0, len(items), size)]
+
+    async def _map(self, func, *args_and_items) -> list:
+        """
+        Splits the last argument into chunks, runs func on every chunk in the
+        process pool and concatenates the results.
+        """
+        *args, items = args_and_items
+        results = await asyncio.gather(
+            *(self._run(func, *args, chunk) for chunk in self._chunks(items))
+        )
+        return [value for chunk in results for value in chunk]
+
+    async def _run(self, func, *args):
+        """
+        Runs func(*args) in the process pool, merging the worker's profile.
+        """
+        loop = asyncio.get_running_loop()
+        return unwrap(await loop.run_in_executor(self.pool, call, func, *args))
+
+    async def _features(self, metric: str, params: dict, codes: Dict[str, str]) -> Dict[str, tuple]:
+        """
+        Preprocessed documents for one metric, by content hash. Documents seen
+        before come from the warm store, the rest are preprocessed in the pool.
+        """
+        params_key = json.dumps(params, sort_keys=True)
+        result = {}
+        missing = {}
+        for digest, code in codes.items():
+            key = (metric, params_key, digest)
+            if key in self.features:
+                self.features.move_to_end(key)
+                result[digest] = self.features[key]
+            else:
+                missing[digest] = code
+        if missing:
+            prepared = await self._map(_prepare, metric, params, list(missing.values()))
+            for digest, value in zip(missing, prepared):
+                result[digest] = value
+                self.features[(metric, params_key, digest)] = value
+            while len(self.features) > MAX_FEATURES:
+                self.features.popitem(last=False)
+        return result
+
+    async def _score(
+        self, metric: str, params: dict, pairs: List[Tuple[str, str]]
+    ) -> List[Tuple[float | None, str | None]]:
+        """
+        Scores code pairs, serving what it can from the pair cache and
+        computing the rest in the pool from warm preprocessed documents.
+
+        Returns:
+            (score, None) or (None, error message) for every pair
+        """
+        hashes = {}
+        for pair in pairs:
+            for code in pair:
+                hashes.setdefault(code, content_hash(code))
+        keys = [canonical_pair(hashes[a], hashes[b]) for a, b in pairs]
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(
+            self.cache_thread, self.cache.get_many, metric, params, keys
+        )
+        results: Dict[Tuple[str, str], tuple] = {key: (score, None) for key, score in cached.items()}
+
+        missing: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        for key, (a, b) in zip(keys, pairs):
+            if key not in results:
+                missing.setdefault(key, (hashes[a], hashes[b]))
+        if missing:
+            codes = {hashes[code]: code for pair in pairs for code in pair}
+            needed = {digest for pair in missing.values() for digest in pair}
+            features = await self._features(
+                metric, params, {digest: codes[digest] for digest in needed}
+            )
+            todo = []
+            for key, (digest_1, digest_2) in missing.items():
+                (feature_1, error_1), (feature_2, error_2) = features[digest_1], features[digest_2]
+                if error_1 or error_2:
+                    results[key] = (None, error_1 or error_2)
+                else:
+                    todo.append((key, (feature_1, feature_2)))
+            scores = await self._map(_score_features, metric, [pair for _, pair in todo])
+            computed = []
+            for (key, _), (score, error) in zip(todo, scores):
+                results[key] = (score, error)
+                if error is None:
+                    computed.append((*key, score))
+            await loop.run_in_executor(
+                self.cache_thread, self.cache.put_many, metric, params, computed
+            )
+        return [results[key] for key in keys]
+
+    async def _score_rows(
+        self, rows: List[dict], pairs: List[Tuple[str, str]], metrics: List[Tuple[str, dict]]
+    ) -> List[dict]:
+        """
+        Adds every metric's score to the rows, collecting errors like
+        metrics.score_pair does.
+        """
+        errors: List[List[str]] = [[] for _ in rows]
+        for name, params in metrics:
+            scores = await self._score(name, params, pairs)
+            for row, row_errors, (score, error) in zip(rows, errors, scores):
+                row[name] = score
+                if error:
+                    row_errors.append(f"{name}: {error}")
+        for row, row_errors in zip(rows, errors):
+            if row_errors:
+                row["error"] = "; ".join(row_errors)
+        return rows
+
+    async def health(self, body: dict) -> dict:
+        return {
+            "status": "ok",
+            "corpus": len(self.corpus),
+            "warm_documents": len(self.features),
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+        }
+
+    async def metrics(self, body: dict) -> str:
+        if not PROFILER.enabled:
+            raise HttpError(404, "profiling is off, start the service with --profile")
+        return PROFILER.to_prometheus()
+
+    async def compare(self, body: dict) -> dict:
+        try:
+            pair = (body["code_1"], body["code_2"])
+        except KeyError as e:
+            raise HttpError(400, f"missing field {e}")
+        return (await self._score_rows([{}], [pair], self._metrics(body)))[0]
+
+    async def batch(self, body: dict) -> dict:
+        codes: Dict[str, str] = body.get("codes") or {}
+        metrics = self._metrics(body)
+        try:
+            thresholds = parse_thresholds([name for name, _ in metrics], body.get("threshold"))
+        except ValueError as e:
+            raise HttpError(400, str(e))
+        names = list(codes)
+        name_pairs = list(combinations(names, 2))
+        pairs = [(codes[a], codes[b]) for a, b in name_pairs]
+        rows = await self._score_rows(
+            [{"file_1": a, "file_2": b} for a, b in name_pairs], pairs, metrics
+        )
+        return {"pairs": [row for row in rows if passes_threshold(row, thresholds)]}
+
+    def _check_new(self, names):
+        for name in names:
+            if name in self.corpus.index:
+                raise HttpError(409, f"{name!r} is already in the corpus")
+
+    async def corpus_add(self, body: dict) -> dict:
+        codes: Dict[str, str] = body.get("codes") or {}
+        self._check_new(codes)
+        docs = await self._map(_preprocess_documents, list(codes.items()))
+        async with self.corpus_lock:
+            # another request may have added the same names while we awaited
+            self._check_new(codes)
+            for doc in docs:
+                self.corpus.add_document(doc)
+        return {"added": len(docs), "corpus": len(self.corpus)}
+
+    async def corpus_query(self, body: dict) -> dict:
+        try:
+            name, code = body["name"], body["code"]
+        except KeyError as e:
+            raise HttpError(400, f"missing field {e}")
+        lcs_top = int(body.get("lcs_top", 10))
+        threshold = float(body.get("threshold", 0.0))
+        add = body.get("add", True)
+        if add:
+            self._check_new([name])
+
+        loop = asyncio.get_running_loop()
+        doc = (await self._run(_preprocess_documents, [(name, code)]))[0]
+        async with self.corpus_lock:
+            results = await loop.run_in_executor(None, self.corpus.query, doc, 0, threshold)
+            top = results[:lcs_top]
+            others = [self.corpus.docs[self.corpus.index[r["name"]]].tokens for r in top]
+        if top:
+            scores = await self._run(_lcs_scores, doc.tokens, others)
+            for entry, score in zip(top, scores):
+                entry["lcs"] = score
+        if add:
+            async with self.corpus_lock:
+                self._check_new([name])
+                self.corpus.add_document(doc)
+        return {"results": results}
+
+    async def moss(self, body: dict) -> dict:
+        codes: Dict[str, str] = body.get("codes") or {}
+        lang = body.get("lang", "python")
+        loop = asyncio.get_running_loop()
+        # network bound, a thread is enough
+        return await loop.run_in_executor(
+            None, MossDetector.compute_similarity_batch, codes, lang
+        )
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Minimal HTTP/1.1 with keep-alive, enough for JSON RPC-style clients.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                try:
+                    length = int(headers.get("content-length", 0))
+                    if length > MAX_BODY:
+                        raise HttpError(413, "request body too large")
+                    raw = await reader.readexactly(length) if length else b""
+                    handler = self.routes.get((method, path.split("?")[0]))
+                    if handler is None:
+                        raise HttpError(404, f"no route for {method} {path}")
+                    try:
+                        body = json.loads(raw) if raw else {}
+                    except json.JSONDecodeError as e:
+                        raise HttpError(400, f"invalid JSON: {e}")
+                    if not isinstance(body, dict):
+                        raise HttpError(400, f"expected a JSON object, got {type(body).__name__}")
+                    status, payload = 200, await handler(body)
+                except HttpError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+
+                if isinstance(payload, str):
+                    data = payload.encode("utf-8")
+                    content_type = "text/plain; version=0.0.4"
+                else:
+                    data = json.dumps(payload).encode("utf-8")
+                    content_type = "application/json"
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1")
+                    + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(
+    host: str,
+    port: int,
+    jobs: int,
+    cache_path: str,
+    corpus_path: str | None,
+    profile: bool = False,
+):
+    if profile:
+        PROFILER.enable()
+    corpus = Corpus.load(corpus_path) if corpus_path and os.path.exists(corpus_path) else Corpus()
+    # workers preprocess corpus documents with the corpus parameters
+    params = Corpus(corpus.n, corpus.k, corpus.window, corpus.base)
+    with PairCache(cache_path) as cache, ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=init_worker,
+        initargs=({"corpus": params}, PROFILER.settings()),
+    ) as pool:
+        service = SimilarityService(pool, jobs, cache, corpus)
+        server = await asyncio.start_server(service.handle, host, port)
+        print(f"listening on http://{host}:{port} with {jobs} workers", flush=True)
+        async with server:
+            try:
+                await server.serve_forever()
+            finally:
+                service.cache_thread.shutdown()
+                if corpus_path:
+                    corpus.save(corpus_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m service", description="Similarity HTTP service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("-j", "--jobs", type=int, default=4)
+    parser.add_argument("--cache", default=":memory:", help="PairCache SQLite file")
+    parser.add_argument("--corpus", help="pickled Corpus, loaded at start and saved on exit")
+    parser.add_argument("--profile", action="store_true", help="collect stage timings, served on /metrics")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(
+            serve(args.host, args.port, args.jobs, args.cache, args.corpus, args.profile)
+        )
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
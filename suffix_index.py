@@ -0,0 +1,181 @@
+from bisect import bisect_right
+from typing import Dict, List
+
+import numpy as np
+
+from utils import normalize_code, tokenize_code
+
+
+def suffix_array(seq: np.ndarray) -> np.ndarray:
+    """
+    Builds the suffix array of an integer sequence by prefix doubling.
+
+    Every round sorts the suffixes by their first 2k symbols using the ranks of
+    the previous round, so only O(log n) numpy sorts are needed.
+
+    Args:
+        seq (np.ndarray): integer symbols.
+
+    Returns:
+        np.ndarray: starting positions of the suffixes in lexicographic order.
+    """
+    n = len(seq)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    rank = np.unique(seq, return_inverse=True)[1].astype(np.int64).ravel()
+    k = 1
+    while True:
+        second = np.full(n, -1, dtype=np.int64)
+        second[: n - k] = rank[k:]
+        sa = np.lexsort((second, rank))
+        first_sorted = rank[sa]
+        second_sorted = second[sa]
+        changed = (first_sorted[1:] != first_sorted[:-1]) | (second_sorted[1:] != second_sorted[:-1])
+        new_rank = np.empty(n, dtype=np.int64)
+        new_rank[sa] = np.concatenate(([0], np.cumsum(changed)))
+        rank = new_rank
+        if rank[sa[-1]] == n - 1 or k >= n:
+            return sa
+        k *= 2
+
+
+def lcp_array(seq: np.ndarray, sa: np.ndarray) -> np.ndarray:
+    """
+    Kasai's algorithm: lcp[i] is the length of the longest common prefix of
+    the suffixes sa[i - 1] and sa[i] (lcp[0] = 0). Runs in O(n).
+    """
+    n = len(seq)
+    values = seq.tolist()
+    order = sa.tolist()
+    rank = [0] * n
+    for i, pos in enumerate(order):
+        rank[pos] = i
+    lcp = [0] * n
+    h = 0
+    for pos in range(n):
+        r = rank[pos]
+        if r == 0:
+            h = 0
+            continue
+        other = order[r - 1]
+        while pos + h < n and other + h < n and values[pos + h] == values[other + h]:
+            h += 1
+        lcp[r] = h
+        if h:
+            h -= 1
+    return np.asarray(lcp, dtype=np.int64)
+
+
+class SuffixIndex:
+    """
+    Suffix array index over the token streams of a whole corpus.
+
+    All documents are mapped to integer token ids and concatenated, each
+    followed by a separator that is unique to that document, so no common
+    prefix can run across a document boundary. Maximal repeated segments are
+    the LCP intervals of the suffix array; their suffixes tell which
+    documents share the segment. One pass finds code copied by many students
+    (copy rings) without any pairwise comparison.
+
+    Example:
+        >>> index = SuffixIndex(codes_dict)
+        >>> index.repeated_segments(min_length=40, min_docs=3)[0]
+        {'length': 112, 'documents': ['a.cpp', 'b.cpp', 'c.cpp'], 'text': 'void merge ( ...', ...}
+    """
+
+    def __init__(self, codes: Dict[str, str], normalize: bool = False):
+        """
+        Args:
+            codes (Dict[str, str]): filename -> code
+            normalize (bool): index normalize_code tokens (identifiers replaced
+                by placeholders) instead of the raw tokenize_code tokens;
+                files that are not valid Python fall back to raw tokens
+        """
+        self.names: List[str] = list(codes)
+        self.tokens: List[List[str]] = [self._tokens(code, normalize) for code in codes.values()]
+
+        num_docs = len(self.names)
+        vocabulary: Dict[str, int] = {}
+        symbols: List[int] = []
+        self.starts: List[int] = []
+        for doc_id, tokens in enumerate(self.tokens):
+            self.starts.append(len(symbols))
+            for tok in tokens:
+                # ids below num_docs are reserved for the separators
+                symbols.append(vocabulary.setdefault(tok, num_docs + len(vocabulary)))
+            symbols.append(doc_id)
+
+        self.seq = np.asarray(symbols, dtype=np.int64)
+        self.sa = suffix_array(self.seq)
+        self.lcp = lcp_array(self.seq, self.sa)
+        starts = np.asarray(self.starts, dtype=np.int64)
+        self.doc_of = np.searchsorted(starts, self.sa, side="right") - 1
+
+    @staticmethod
+    def _tokens(code: str, normalize: bool) -> List[str]:
+        if normalize:
+            try:
+                return normalize_code(code)[0].split()
+            except SyntaxError:
+                pass
+        return tokenize_code(code)
+
+    def _locate(self, pos: int):
+        doc_id = bisect_right(self.starts, pos) - 1
+        return doc_id, pos - self.starts[doc_id]
+
+    def repeated_segments(self, min_length: int = 30, min_docs: int = 2) -> List[dict]:
+        """
+        Reports maximal repeated token segments shared by several documents.
+
+        A segment is reported once for the longest run its occurrences share
+        (right-maximal) and only if it cannot be extended to the left in all
+        occurrences at once (left-maximal).
+
+        Args:
+            min_length (int): minimal segment length in tokens
+            min_docs (int): minimal number of distinct documents containing it
+
+        Returns:
+            List[dict]: {"length", "documents", "occurrences", "text"} with
+            occurrences as (filename, token offset), most widely shared first
+        """
+        n = len(self.seq)
+        sa = self.sa
+        previous = np.where(sa > 0, self.seq[np.maximum(sa - 1, 0)], -1)
+        results = []
+
+        def report(length: int, lb: int, rb: int):
+            if length < min_length:
+                return
+            docs = np.unique(self.doc_of[lb : rb + 1])
+            if len(docs) < min_docs:
+                return
+            left = previous[lb : rb + 1]
+            if left[0] != -1 and np.all(left == left[0]):
+                return
+            occurrences = [self._locate(p) for p in sorted(sa[lb : rb + 1].tolist())]
+            doc_id, offset = occurrences[0]
+            tokens = self.tokens[doc_id][offset : offset + length]
+            results.append(
+                {
+                    "length": length,
+                    "documents": [self.names[d] for d in docs],
+                    "occurrences": [(self.names[d], o) for d, o in occurrences],
+                    "text": " ".join(tokens),
+                }
+            )
+
+        # bottom-up traversal of the LCP interval tree
+        stack = [(0, 0)]  # (lcp value, left bound)
+        for i in range(1, n + 1):
+            current = int(self.lcp[i]) if i < n else 0
+            lb = i - 1
+            while current < stack[-1][0]:
+                length, lb = stack.pop()
+                report(length, lb, i - 1)
+            if current > stack[-1][0]:
+                stack.append((current, lb))
+
+        results.sort(key=lambda r: (len(r["documents"]), r["length"]), reverse=True)
+        return results
@@ -0,0 +1,76 @@
+import copy
+import random
+import time
+
+import pytest
+
+from corpus import Corpus
+from lcs import normalized_lcs
+
+TEMPLATE = """
+def solve_{i}(data, limit):
+    result = []
+    total = 0
+    for index, value in enumerate(data):
+        if value % {a} == 0 and index < limit:
+            total += value * {b}
+            result.append(total)
+        elif value > {c}:
+            result.append(value - total)
+        else:
+            total -= {a}
+    return result, total
+"""
+
+
+def submission(rng: random.Random, functions: int = 6) -> str:
+    return "\n".join(
+        TEMPLATE.format(i=i, a=rng.randrange(2, 9), b=rng.randrange(10), c=rng.randrange(100))
+        for i in range(functions)
+    )
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    """
+    10k stored files of ~500 tokens. Preprocessing 10k files would dominate
+    the test, so 200 distinct documents are stored 50 times under new names.
+    """
+    rng = random.Random(0)
+    corpus = Corpus()
+    variants = [corpus.preprocess(f"v{i}.py", submission(rng)) for i in range(200)]
+    for i in range(10_000):
+        doc = copy.copy(variants[i % len(variants)])
+        doc.name = f"s{i}.py"
+        corpus.add_document(doc)
+    return corpus
+
+
+def test_check_against_10k_files_is_fast(corpus):
+    code = submission(random.Random(1))
+    assert 400 <= len(corpus.preprocess("x.py", code).tokens) <= 700
+    corpus.check("warmup.py", code, add=False)
+
+    start = time.perf_counter()
+    results = corpus.check("late.py", code)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.5, f"check took {elapsed:.2f}s"
+    assert len(results) == 10_000
+    assert len(corpus) == 10_001
+    top = [r for r in results if "lcs" in r]
+    assert len(top) == 10
+    new = corpus.docs[corpus.index["late.py"]]
+    for entry in top:
+        other = corpus.docs[corpus.index[entry["name"]]]
+        # approximate LCS is a lower bound, and close on similar files
+        exact = normalized_lcs(new.tokens, other.tokens)
+        assert exact - 0.05 <= entry["lcs"] <= exact + 1e-9
+
+
+def test_check_rejects_duplicate_names():
+    corpus = Corpus()
+    corpus.check("a.py", "x = 1\n")
+    with pytest.raises(ValueError):
+        corpus.check("a.py", "y = 2\n")
+    assert len(corpus) == 1
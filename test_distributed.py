@@ -0,0 +1,116 @@
+import json
+import multiprocessing
+import os
+import signal
+import time
+
+import pytest
+
+from batch_runner import run
+from distributed import Worker, init_workdir, reduce_results, status
+
+CODES = {
+    f"s{i:02d}.py": "\n".join(
+        f"v{(i + line) % 7} = v{line % 4} * {i % 3}" for line in range(i % 5 + 2)
+    )
+    for i in range(14)
+}
+# the last file is not Python, so Jaccard fails on every pair with it
+CODES["z.c"] = "int main() { return 0; }"
+METRICS = [("lcs", {}), ("jaccard", {"n": 3})]
+LEASE = 1.0
+
+context = multiprocessing.get_context("fork")
+
+
+def _claim_and_hang(workdir: str, claimed):
+    worker = Worker(workdir, "doomed", heartbeat=0.1)
+    assert worker.claim(0)
+    claimed.set()
+    time.sleep(60)
+
+
+def _work(workdir: str):
+    Worker(workdir, heartbeat=0.1).run()
+
+
+def _key(row: dict):
+    return row["file_1"], row["file_2"]
+
+
+def test_workers_recover_from_a_killed_worker(tmp_path):
+    workdir = str(tmp_path / "work")
+    blocks = init_workdir(workdir, CODES, METRICS, block_size=4, lease_seconds=LEASE)
+
+    claimed = context.Event()
+    doomed = context.Process(target=_claim_and_hang, args=(workdir, claimed))
+    doomed.start()
+    assert claimed.wait(30)
+    os.kill(doomed.pid, signal.SIGKILL)
+    doomed.join()
+
+    workers = [context.Process(target=_work, args=(workdir,)) for _ in range(3)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join(60)
+        assert w.exitcode == 0
+
+    assert status(workdir) == {"blocks": blocks, "done": blocks, "claimed": 0, "pending": 0}
+    assert os.listdir(os.path.join(workdir, "claims")) == []
+    distributed = sorted(reduce_results(workdir), key=_key)
+    expected = sorted(run(CODES, METRICS), key=_key)
+    assert distributed == expected
+    assert any("error" in row for row in distributed)
+
+
+def test_steal_does_not_take_a_live_claim(tmp_path):
+    workdir = str(tmp_path / "work")
+    init_workdir(workdir, CODES, METRICS, block_size=4, lease_seconds=LEASE)
+    lock = os.path.join(workdir, "claims", "0.lock")
+    with open(lock, "w", encoding="utf-8") as f:
+        json.dump({"worker": "dead"}, f)
+    old = time.time() - 10 * LEASE
+    os.utime(lock, (old, old))
+
+    slow, fast = Worker(workdir, "slow"), Worker(workdir, "fast")
+    # slow saw the stale lock, but fast stole it and claimed the block first
+    seen = slow._read_lock(lock)
+    assert fast.claim(0)
+    assert not slow._steal(lock, *seen)
+    assert fast.owns(0) and not slow.owns(0)
+
+    # a worker that does not hold the lock cannot release it
+    slow.release(0)
+    assert fast.owns(0)
+    fast.release(0)
+    assert not os.path.exists(lock)
+    assert os.listdir(os.path.dirname(lock)) == []
+
+
+def test_init_does_not_mix_runs(tmp_path):
+    workdir = str(tmp_path / "work")
+    init_workdir(workdir, CODES, METRICS, block_size=8)
+    Worker(workdir).run()
+    with pytest.raises(FileExistsError):
+        init_workdir(workdir, {"b1.py": "x = 1", "b2.py": "y = 2"}, METRICS)
+
+    other = {"b1.py": "x = 1", "b2.py": "y = 2", "b3.py": "z = 3"}
+    blocks = init_workdir(workdir, other, METRICS, block_size=8, force=True)
+    assert status(workdir) == {"blocks": blocks, "done": 0, "claimed": 0, "pending": blocks}
+    Worker(workdir).run()
+    assert sorted(map(_key, reduce_results(workdir))) == [
+        ("b1.py", "b2.py"), ("b1.py", "b3.py"), ("b2.py", "b3.py")
+    ]
+
+
+def test_workdir_digest_is_checked(tmp_path):
+    workdir = str(tmp_path / "work")
+    init_workdir(workdir, CODES, METRICS, block_size=8)
+    Worker(workdir).run()
+    with open(os.path.join(workdir, "documents.json"), "w", encoding="utf-8") as f:
+        json.dump([["b1.py", "x = 1"], ["b2.py", "y = 2"]], f)
+    with pytest.raises(ValueError):
+        Worker(workdir)
+    with pytest.raises(ValueError):
+        list(reduce_results(workdir))
@@ -0,0 +1,78 @@
+import multiprocessing
+import os
+import signal
+from functools import partial
+
+import pytest
+
+from lcs import compute_lcs
+from matrix_store import SimilarityMatrixStore, run_all_pairs
+
+NUM_DOCS = 23
+BLOCK_SIZE = 4
+KILL_AFTER = 5
+
+
+def make_codes():
+    return [
+        "\n".join(f"x{(doc * 7 + line) % 11} = x{line % 5} + {doc % 3}" for line in range(doc % 9 + 3))
+        for doc in range(NUM_DOCS)
+    ]
+
+
+def _run_until_killed(path: str):
+    store = SimilarityMatrixStore(path, NUM_DOCS, BLOCK_SIZE)
+    finished = []
+
+    def on_block(block_id: int):
+        finished.append(block_id)
+        if len(finished) == KILL_AFTER:
+            os.kill(os.getpid(), signal.SIGKILL)
+
+    run_all_pairs(store, make_codes(), on_block=on_block)
+
+
+def test_resume_after_kill_matches_fresh_run(tmp_path):
+    fresh_path = str(tmp_path / "fresh.bin")
+    with SimilarityMatrixStore(fresh_path, NUM_DOCS, BLOCK_SIZE) as fresh:
+        run_all_pairs(fresh, make_codes(), jobs=2)
+        assert fresh.is_complete()
+
+    resumed_path = str(tmp_path / "resumed.bin")
+    child = multiprocessing.get_context("fork").Process(target=_run_until_killed, args=(resumed_path,))
+    child.start()
+    child.join(timeout=60)
+    assert child.exitcode == -signal.SIGKILL
+
+    with SimilarityMatrixStore(resumed_path, NUM_DOCS, BLOCK_SIZE) as resumed:
+        total = len(resumed.block_list)
+        pending = resumed.pending_blocks()
+        assert len(pending) == total - KILL_AFTER
+        assert run_all_pairs(resumed, make_codes(), jobs=3) == len(pending)
+        assert resumed.is_complete()
+
+    for suffix in ("", ".done"):
+        with open(fresh_path + suffix, "rb") as f, open(resumed_path + suffix, "rb") as g:
+            assert f.read() == g.read()
+
+
+def test_reopen_with_other_shape_fails(tmp_path):
+    path = str(tmp_path / "m.bin")
+    SimilarityMatrixStore(path, NUM_DOCS, BLOCK_SIZE).close()
+    with pytest.raises(ValueError):
+        SimilarityMatrixStore(path, NUM_DOCS + 1, BLOCK_SIZE)
+
+
+def test_resume_with_other_inputs_fails(tmp_path):
+    path = str(tmp_path / "m.bin")
+    codes = make_codes()
+    with SimilarityMatrixStore(path, NUM_DOCS, BLOCK_SIZE) as store:
+        run_all_pairs(store, codes)
+
+    with SimilarityMatrixStore(path, NUM_DOCS, BLOCK_SIZE) as store:
+        # same inputs: nothing left to do
+        assert run_all_pairs(store, codes) == 0
+        with pytest.raises(ValueError):
+            run_all_pairs(store, codes[::-1])
+        with pytest.raises(ValueError):
+            run_all_pairs(store, codes, metric=partial(compute_lcs, approximate=True))
@@ -0,0 +1,26 @@
+import pytest
+
+from metrics import parse_thresholds, passes_threshold
+
+NAMES = ["lcs", "jaccard"]
+
+
+def test_parse_thresholds():
+    assert parse_thresholds(NAMES) == {"lcs": 0.0, "jaccard": 0.0}
+    assert parse_thresholds(NAMES, 0.5) == {"lcs": 0.5, "jaccard": 0.5}
+    assert parse_thresholds(NAMES, ["lcs=0.6", "0.3"]) == {"lcs": 0.6, "jaccard": 0.3}
+    assert parse_thresholds(NAMES, {"jaccard": 0.4}) == {"lcs": 0.0, "jaccard": 0.4}
+    with pytest.raises(ValueError):
+        parse_thresholds(NAMES, ["moss=0.5"])
+    with pytest.raises(ValueError):
+        parse_thresholds(NAMES, ["lcs=high"])
+
+
+def test_passes_threshold():
+    thresholds = {"lcs": 0.6, "jaccard": 0.4}
+    assert passes_threshold({"lcs": 0.5, "jaccard": 0.45}, thresholds)
+    assert not passes_threshold({"lcs": 0.5, "jaccard": 0.3}, thresholds)
+    # Jaccard failed, LCS alone decides
+    assert not passes_threshold({"lcs": 0.5, "jaccard": None, "error": "x"}, thresholds)
+    # nothing could be scored: always reported
+    assert passes_threshold({"lcs": None, "jaccard": None, "error": "x"}, thresholds)
@@ -0,0 +1,61 @@
+from itertools import combinations
+
+import pytest
+
+from fake_moss_server import FakeMossServer, pair_score
+from moss_scheduler import MossScheduler, parse_report, partition_queries
+
+CODES = {f"s{i:02d}.py": f"x = {i}\n" for i in range(20)}
+
+
+def scheduler(server: FakeMossServer, **kwargs) -> MossScheduler:
+    options = {"max_files": 8, "concurrency": 3, "retries": 2, "backoff": 0.01}
+    options.update(kwargs)
+    return MossScheduler(CODES, user_id="1", server="127.0.0.1", port=server.port, **options)
+
+
+def test_partition_covers_every_pair():
+    names = list(CODES)
+    queries = partition_queries(names, 8)
+    assert all(len(q) <= 8 for q in queries)
+    covered = {tuple(sorted(p)) for q in queries for p in combinations(q, 2)}
+    assert covered == {tuple(sorted(p)) for p in combinations(names, 2)}
+
+
+def test_run_against_fake_server():
+    with FakeMossServer(drop_queries=1, delay=0.05) as server:
+        ranking = scheduler(server).run()
+
+    queries = partition_queries(list(CODES), 8)
+    # the dropped query was retried, every query got answered exactly once
+    assert server.dropped == 1
+    assert sorted(map(sorted, server.queries)) == sorted(map(sorted, queries))
+    assert 1 < server.max_active <= 3
+
+    # every reported pair appears once, with its best score over all queries
+    expected = {}
+    for files in server.queries:
+        for key, percent in server.expected_pairs(files).items():
+            expected[key] = max(expected.get(key, 0), percent)
+    got = {tuple(sorted((p["file_1"], p["file_2"]))): p["percent_1"] for p in ranking}
+    assert len(got) == len(ranking)
+    assert got == expected
+    assert set(expected) == {
+        tuple(sorted(p)) for p in combinations(CODES, 2) if pair_score(*p) >= server.threshold
+    }
+    scores = [max(p["percent_1"], p["percent_2"]) for p in ranking]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_run_gives_up_after_retries():
+    with FakeMossServer(drop_queries=100) as server:
+        with pytest.raises(Exception):
+            scheduler(server, concurrency=1, retries=1).run()
+    assert server.dropped >= 2
+
+
+def test_parse_report():
+    with FakeMossServer(threshold=0) as server:
+        pairs = parse_report(server.report(["a.py", "b.py"], 0))
+    assert [(p["file_1"], p["file_2"]) for p in pairs] == [("a.py", "b.py")]
+    assert pairs[0]["percent_1"] == pairs[0]["percent_2"] + 1
@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+from batch_runner import run
+from profiling import PROFILER, Profiler
+
+
+@pytest.fixture
+def profiler():
+    PROFILER.reset()
+    PROFILER.enable()
+    yield PROFILER
+    PROFILER.disable()
+    PROFILER.reset()
+
+
+def test_worker_profiles_are_merged(profiler):
+    codes = {f"s{i}.py": f"x = {i}\ny = x * {i}\n" for i in range(8)}
+    rows = list(run(codes, [("lcs", {})], jobs=2, chunksize=3))
+    data = profiler.to_dict()
+    assert data["counters"]["pairs"] == len(rows) == 28
+    assert data["stages"]["lcs_dp"]["calls"] == 28
+
+
+def test_stages_nest_per_thread():
+    profiler = Profiler()
+    profiler.enable()
+    inside = threading.Barrier(2)
+    seen = {}
+
+    def work(name):
+        with profiler.stage(name):
+            inside.wait()
+            with profiler.stage(f"{name}.inner"):
+                seen[name] = [s.name for s in profiler._stack]
+            inside.wait()
+
+    threads = [threading.Thread(target=work, args=(name,)) for name in ("a", "b")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert seen == {"a": ["a", "a.inner"], "b": ["b", "b.inner"]}
+    stages = profiler.to_dict()["stages"]
+    assert {name: stats["calls"] for name, stats in stages.items()} == {
+        "a": 1, "b": 1, "a.inner": 1, "b.inner": 1
+    }
+
+
+def test_merge_adds_up():
+    profiler = Profiler()
+    profiler.merge(
+        {"stages": {"x": {"calls": 2, "seconds": 1.0, "max_seconds": 0.7}}, "counters": {"pairs": 3}}
+    )
+    profiler.merge(
+        {"stages": {"x": {"calls": 1, "seconds": 0.5, "max_seconds": 0.5}}, "counters": {"pairs": 1}}
+    )
+    assert profiler.to_dict() == {
+        "stages": {"x": {"calls": 3, "seconds": 1.5, "max_seconds": 0.7}},
+        "counters": {"pairs": 4},
+    }
@@ -0,0 +1,51 @@
+import json
+
+import numpy as np
+
+from results import ClusterBuilder, SimilaritySink, TopKSink, UnionFind, load_clusters
+
+
+def test_top_k_evicts_weakest_partner():
+    sink = TopKSink(k=2)
+    sink.add("a", "b", 0.5)
+    sink.add("a", "c", 0.9)
+    sink.add("a", "d", 0.1)  # weaker than both, rejected
+    assert sink.neighbours("a") == [("c", 0.9), ("b", 0.5)]
+    sink.add("a", "e", 0.7)  # evicts b
+    assert sink.neighbours("a") == [("c", 0.9), ("e", 0.7)]
+    # pairs are symmetric, d still keeps a as its only partner
+    assert sink.neighbours("d") == [("a", 0.1)]
+    assert all(len(heap) <= 2 for heap in sink.heaps.values())
+
+
+def test_union_find_merges_sets():
+    uf = UnionFind()
+    assert uf.union(1, 2)
+    assert uf.union(3, 4)
+    assert not uf.union(2, 1)
+    assert uf.find(1) == uf.find(2) != uf.find(3)
+    assert uf.union(2, 4)
+    assert uf.find(1) == uf.find(3)
+    assert sorted(map(sorted, uf.groups().values())) == [[1, 2, 3, 4]]
+    assert uf.size[uf.find(1)] == 4
+    assert uf.find(5) == 5
+
+
+def test_clusters_written_incrementally(tmp_path):
+    edges = str(tmp_path / "edges.jsonl")
+    rows, cols = np.array([0, 1, 3], dtype=np.int32), np.array([1, 2, 4], dtype=np.int32)
+    for _ in range(2):  # a rerun must not duplicate edges
+        with SimilaritySink(k=2, threshold=0.5, edges_path=edges) as sink:
+            for i, j, score in zip(rows, cols, np.array([0.9, 0.6, 0.4], dtype=np.float32)):
+                sink.add(i, j, score)
+            # on disk before the run finishes
+            assert sorted(map(sorted, load_clusters(edges))) == [[0, 1, 2]]
+
+    with open(edges, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert [(e["a"], e["b"], e["merged"]) for e in lines] == [(0, 1, True), (1, 2, True)]
+
+    builder = ClusterBuilder(threshold=0.5)
+    builder.add(np.int64(7), np.int64(8), 0.8)
+    out = str(tmp_path / "clusters.jsonl")
+    assert builder.write_clusters(out) == 1
@@ -0,0 +1,160 @@
+from typing import Dict, List
+
+import numpy as np
+from scipy import sparse
+
+from jaccard import build_ngrams
+from utils import normalize_code, tokenize_code
+
+
+class TfidfVectorizer:
+    """
+    Turns code snippets into TF-IDF weighted n-gram vectors.
+
+    Unlike plain Jaccard, n-grams that occur in almost every submission
+    (loop headers, boilerplate) get a low inverse document frequency and
+    barely contribute to the similarity, while rare shared n-grams dominate.
+
+    Steps:
+    1. Normalize code and build token n-grams (same as Jaccard).
+    2. Count term frequencies per document.
+    3. Weight by smoothed idf = ln((1 + N) / (1 + df)) + 1.
+    4. L2-normalize rows so that a dot product is a cosine similarity.
+    """
+
+    def __init__(self, n: int = 3):
+        self.n = n
+        self.vocabulary: Dict[str, int] = {}
+        self.idf: np.ndarray | None = None
+
+    def _ngrams(self, code: str) -> List[str]:
+        try:
+            tokens = normalize_code(code)[0].split()
+        except SyntaxError:
+            # same fallback as Corpus: non-Python code uses raw tokens
+            tokens = tokenize_code(code)
+        return build_ngrams(tokens, self.n)
+
+    def _counts(self, docs: List[List[str]], grow: bool) -> sparse.csr_matrix:
+        indptr = [0]
+        indices: List[int] = []
+        data: List[int] = []
+        for ngrams in docs:
+            counts: Dict[int, int] = {}
+            for ngram in ngrams:
+                col = self.vocabulary.get(ngram)
+                if col is None:
+                    if not grow:
+                        continue
+                    col = len(self.vocabulary)
+                    self.vocabulary[ngram] = col
+                counts[col] = counts.get(col, 0) + 1
+            indices.extend(counts.keys())
+            data.extend(counts.values())
+            indptr.append(len(indices))
+        return sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float64), indices, indptr),
+            shape=(len(docs), len(self.vocabulary)),
+        )
+
+    def _weight(self, tf: sparse.csr_matrix) -> sparse.csr_matrix:
+        matrix = tf.multiply(self.idf).tocsr()
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.diags(1.0 / norms) @ matrix
+
+    def fit_transform(self, codes: List[str]) -> sparse.csr_matrix:
+        """
+        Args:
+            codes: List[str] - code snippets forming the corpus
+
+        Return:
+            scipy.sparse.csr_matrix - one L2-normalized TF-IDF row per snippet
+        """
+        self.vocabulary = {}
+        tf = self._counts([self._ngrams(code) for code in codes], grow=True)
+        df = np.bincount(tf.indices, minlength=tf.shape[1])
+        num_docs = len(codes)
+        self.idf = np.log((1 + num_docs) / (1 + df)) + 1.0
+        return self._weight(tf)
+
+    def transform(self, codes: List[str]) -> sparse.csr_matrix:
+        """
+        Vectorize new snippets with the vocabulary and idf learned in fit_transform.
+        N-grams never seen during fitting are ignored.
+        """
+        if self.idf is None:
+            raise RuntimeError("transform() called before fit_transform()")
+        tf = self._counts([self._ngrams(code) for code in codes], grow=False)
+        return self._weight(tf)
+
+
+def cosine_similarity_blocks(
+    matrix: sparse.csr_matrix, threshold: float = 0.0, block_size: int = 1024
+) -> sparse.coo_matrix:
+    """
+    All-pairs cosine similarity of L2-normalized rows, computed block by block.
+
+    Each block of rows is multiplied with the transposed matrix, entries below
+    `threshold` are dropped immediately, so the dense N x N result never exists.
+
+    Args:
+        matrix: L2-normalized rows (for example TfidfVectorizer output)
+        threshold: float - minimum similarity to keep
+        block_size: int - how many rows are multiplied at once
+
+    Return:
+        scipy.sparse.coo_matrix - strictly upper-triangular matrix (i < j)
+        containing the similarities that reached the threshold
+    """
+    num_docs = matrix.shape[0]
+    transposed = matrix.T.tocsc()
+    rows: List[np.ndarray] = []
+    cols: List[np.ndarray] = []
+    vals: List[np.ndarray] = []
+
+    for start in range(0, num_docs, block_size):
+        stop = min(start + block_size, num_docs)
+        block = (matrix[start:stop] @ transposed).tocoo()
+        r = block.row + start
+        # keep each pair once and drop the diagonal
+        mask = (block.col > r) & (block.data >= threshold)
+        rows.append(r[mask])
+        cols.append(block.col[mask])
+        vals.append(block.data[mask])
+
+    if not rows:
+        return sparse.coo_matrix((num_docs, num_docs))
+    return sparse.coo_matrix(
+        (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(num_docs, num_docs),
+    )
+
+
+def compute_tfidf_similarity_batch(
+    codes: List[str], n: int = 3, threshold: float = 0.0, block_size: int = 1024
+) -> sparse.coo_matrix:
+    """
+    Args:
+        codes: List[str] - code snippets to compare with each other
+        n: int - how many tokens are taken into account
+        threshold: float - minimum cosine similarity to report
+        block_size: int - rows per sparse matrix multiplication
+
+    Return:
+        scipy.sparse.coo_matrix - thresholded upper-triangular TF-IDF cosine
+        similarities, entry (i, j) compares codes[i] with codes[j]
+    """
+    vectors = TfidfVectorizer(n).fit_transform(codes)
+    return cosine_similarity_blocks(vectors, threshold, block_size)
+
+
+def compute_tfidf_similarity(code_1: str, code_2: str, n: int = 3) -> float:
+    """
+    TF-IDF cosine similarity of two snippets. With only two documents the idf
+    can merely tell shared from unshared n-grams; the batch version is where
+    TF-IDF pays off.
+    """
+    vectors = TfidfVectorizer(n).fit_transform([code_1, code_2])
+    similarity = (vectors[0] @ vectors[1].T).toarray()[0, 0]
+    return float(min(1.0, similarity))
@@ -4,7 +4,10 @@ import builtins
 import keyword
 from typing import List, Tuple, Set
 
+from profiling import count, stage, timed
 
+
+@timed("remove_comments_and_docstrings")
 def remove_comments_and_docstrings(code: str) -> str:
     """
     Remove comments and docstrings from a block of Python source code.
@@ -25,6 +28,7 @@ def remove_comments_and_docstrings(code: str) -> str:
     return code.strip()
 
 
+@timed("normalize_code")
 def normalize_code(code: str) -> Tuple[str, dict]:
     """
     Normalize Python code by replacing user-defined names with placeholders.
@@ -66,7 +70,8 @@ def normalize_code(code: str) -> Tuple[str, dict]:
     if not code_clean.strip():
         return "", {}
 
-    tree = ast.parse(code_clean)
+    with stage("ast.parse"):
+        tree = ast.parse(code_clean)
 
     # First pass: collect function & class names
     class Collector(ast.NodeVisitor):
@@ -170,7 +175,8 @@ def normalize_code(code: str) -> Tuple[str, dict]:
     )
     tree = normalizer.visit(tree)
     ast.fix_missing_locations(tree)
-    normalized_code = ast.unparse(tree)
+    with stage("ast.unparse"):
+        normalized_code = ast.unparse(tree)
 
     # Keep indentation but remove blank lines
     normalized_code = "\n".join(
@@ -198,6 +204,7 @@ TOKEN_REGEX = re.compile(
 )
 
 
+@timed("tokenize_code")
 def tokenize_code(code: str) -> List[str]:
     """
     Tokenize a code string into a list of tokens.
@@ -211,4 +218,10 @@ def tokenize_code(code: str) -> List[str]:
         List[str]: A list of tokens.
     """
     code = remove_comments_and_docstrings(code)
-    return [m.group(0) for m in TOKEN_REGEX.finditer(code)]
+    with stage("token_regex"):
+        tokens = [m.group(0) for m in TOKEN_REGEX.finditer(code)]
+    # called for every pair by compute_lcs, so these are not per file;
+    # "files" and "tokens" are counted where documents enter (Corpus, batch_runner)
+    count("tokenize_calls")
+    count("tokens_scanned", len(tokens))
+    return tokens